@@ -1,14 +1,50 @@
-from ortools.sat.python import cp_model
-import re
-from utils import *
+import heapq
+import os
+import time
+from tracing import span
+from constraint_index import ConstraintGroupIndex
+from interned_schedule import InternedSchedule, intern_schedule
 
+# Up to this many meals CP-SAT is fastest on one worker, bigger models get one per core
+SINGLE_WORKER_MEALS = 200
+MAX_WORKERS = 8
+DEFAULT_TIME_LIMIT = 10
 
-def solve_food_schedule(food_schedule, preferences, constraints=[], time_limit=None):
+
+def add_gap_constraint(model, day_meals, group_match_bools, gap):
+    """
+    Forbid two meals of a group closer than `gap` meals apart.
+
+    Every window of `gap` consecutive meals may hold at most one match. That's one constraint
+    per meal instead of one per pair of meals, so the model grows linearly with the horizon.
+
+    Args:
+        day_meals: All meals of the schedule in chronological order
+        group_match_bools: meal -> BoolVar, true if the meal's selected food is in the group
+    """
+    if gap < 2:
+        return
+    positions = [j for j, meal in enumerate(day_meals) if meal in group_match_bools]
+    start = 0
+    for end in range(len(positions)):
+        # shrink the window until it spans less than `gap` meals
+        while positions[end] - positions[start] >= gap:
+            start += 1
+        # only maximal windows are needed, the ones the next meal doesn't fit in
+        if end + 1 < len(positions) and positions[end + 1] - positions[start] < gap:
+            continue
+        if end > start:
+            model.AddAtMostOne(group_match_bools[day_meals[j]] for j in positions[start:end + 1])
+
+
+def solve_food_schedule(food_schedule, preferences, constraints=[], time_limit=None, group_index=None, stats=None,
+                        hints=None, fixed=None, history=None, exclude=None, verbose=True, solver="auto",
+                        log_search=False, cache=None):
     """
     Solve food scheduling problem with grouped constraints.
     
     Args:
-        food_schedule: dict from (day, meal_type) to list of (food, meal_type, salon)
+        food_schedule: dict from (day, meal_type) to list of (food, meal_type, salon), or an InternedSchedule of it
         preferences: dict from food names to scores
         constraints: List of dicts, e.g.:
                      [
@@ -16,45 +52,289 @@ def solve_food_schedule(food_schedule, preferences, constraints=[], time_limit=N
                         {"foods": ["Kebab"], "limit": 2, "gap": 3}
                      ]
         time_limit: Max time in seconds
+        group_index: ConstraintGroupIndex of the constraints, to reuse matches from earlier solves
+        stats: Optional dict, filled with model size and build/solve times
+        hints: Previous solution {meal: (food, meal_type, salon)} to start the search from
+        fixed: {meal: (food, meal_type, salon)} choices that must be kept, if still offered
+        history: What was reserved before this schedule, per constraint index:
+                 {"counts": {i: matches counting toward the limit},
+                  "distances": {i: meals from the last match to the first meal of this schedule}}
+        exclude: Earlier solutions that must not be returned again, to get the next best ones
+        verbose: Print the preferences and the solution
+        solver: "auto" solves limits_only schedules as a min-cost flow and the rest with CP-SAT,
+                "cp-sat" always uses CP-SAT
+        log_search: Print CP-SAT's search log
+        cache: SolutionCache to look the problem up in before solving, and to store the solution in.
+               On a miss, its latest solution under the same constraints is used as hints.
     """
-    
-    # Ensure day_meals is consistent (sorting by day recommended if keys aren't sorted)
-    print(f'User preferences:\n{preferences}')
-    
+    log = print if verbose else (lambda *args, **kwargs: None)
+
+    log(f'User preferences:\n{preferences}')
+
+    solution = None
+    if cache is not None:
+        lookup_start = time.perf_counter()
+        key = cache.key(food_schedule, preferences, constraints, fixed=fixed, history=history, exclude=exclude)
+        solution = cache.get(key)
+        if solution is not None:
+            status = "CACHED"
+            if stats is not None:
+                stats.update(solver="cache", build_time=0, solve_time=time.perf_counter() - lookup_start,
+                             variables=0, constraints=0, status=status,
+                             objective=sum(preferences.get(food, 0) for food, *_ in solution.values()))
+        else:
+            hints = hints or cache.latest(constraints)
+
+    group_index = group_index or ConstraintGroupIndex(constraints)
+    if solution is None:
+        food_schedule = intern_schedule(food_schedule, preferences)
+        with span("solve", meals=len(food_schedule)) as solve_span:
+            if solver == "auto" and not exclude and limits_only(food_schedule, constraints, group_index):
+                solve_span["solver"] = "flow"
+                solution, status = solve_limits_by_flow(food_schedule, preferences, constraints, group_index,
+                                                        fixed=fixed, history=history, stats=stats)
+            else:
+                solve_span["solver"] = "cp-sat"
+                log("Solving for optimal schedule...")
+                solution, status = solve_with_cp_sat(food_schedule, preferences, constraints, time_limit, group_index,
+                                                     stats, hints, fixed, history, exclude, log_search)
+            solve_span["outcome"] = status
+        # a solution cut short by the time limit may be beaten by the next solve
+        if cache is not None and status == "OPTIMAL":
+            cache.put(key, solution, constraints)
+
+    if solution is None:
+        log("No solution found that satisfies all constraints.")
+        return None
+
+    total_score = 0
+    log("-" * 40)
+    log(f"Solution Status: {status}")
+    log("Food reservation plan:")
+    for meal, (food, mtype, salon) in solution.items():
+        score = preferences.get(food, 0)
+        total_score += score
+        log(f"  {meal}: {food} ({salon}) [Score: {score}]")
+    log("-" * 40)
+    log(f"Total Score: {total_score}")
+    return solution
+
+
+def limits_only(food_schedule, constraints, group_index):
+    """
+    Whether the constraints are only limits, with no food in more than one limited group.
+    Such schedules are solved exactly by solve_limits_by_flow, without loading OR-Tools.
+    """
+    if any(constraint.get("foods") and int(constraint.get("gap") or 0) >= 2 for constraint in constraints):
+        return False
+    limited = {i for i, constraint in enumerate(constraints) if constraint.get("foods") and constraint.get("limit") is not None}
+    if isinstance(food_schedule, InternedSchedule):
+        foods = [food_schedule.foods.names[f] for f in set(food_schedule.food)]
+    else:
+        foods = {food for options in food_schedule.values() for food, *_ in options}
+    return all(len(limited.intersection(group_index.groups(food))) <= 1 for food in foods)
+
+
+def min_cost_flow(graph, to, capacity, cost, source, sink, flow):
+    """
+    Send `flow` units from source to sink one by one along the cheapest path (Dijkstra with
+    potentials, so costs must be non-negative). Capacities are updated in place.
+
+    Args:
+        graph: node -> indices of its arcs; arc e's reverse arc is e ^ 1
+
+    Returns:
+        bool: False if the sink can't take that much flow
+    """
+    potential = [0] * len(graph)
+    for _ in range(flow):
+        dist = [float("inf")] * len(graph)
+        prev = [-1] * len(graph)
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for e in graph[u]:
+                v = to[e]
+                nd = d + cost[e] + potential[u] - potential[v]
+                if capacity[e] > 0 and nd < dist[v]:
+                    dist[v] = nd
+                    prev[v] = e
+                    heapq.heappush(heap, (nd, v))
+        if dist[sink] == float("inf"):
+            return False
+        for v, d in enumerate(dist):
+            if d < float("inf"):
+                potential[v] += d
+        v = sink
+        while v != source:
+            e = prev[v]
+            capacity[e] -= 1
+            capacity[e ^ 1] += 1
+            v = to[e ^ 1]
+    return True
+
+
+def solve_limits_by_flow(food_schedule, preferences, constraints, group_index, fixed=None, history=None, stats=None):
+    """
+    Exact solver for limits_only schedules.
+
+    Every meal sends one unit of flow to the sink, either straight through its best food outside
+    the limited groups or through a group's node, whose arc to the sink holds what's left of the
+    group's limit. An arc costs the top score minus the food's score, so the cheapest flow is
+    the plan with the highest total score.
+
+    Returns:
+        tuple: (solution or None if infeasible, status name)
+    """
+    build_start = time.perf_counter()
+    table = intern_schedule(food_schedule, preferences)
+    food_score = table.scores(preferences)
+    food_groups = table.food_groups(group_index)
+    past_counts = (history or {}).get("counts", {})
+    limits = {
+        i: max(0, int(constraint["limit"]) - past_counts.get(i, 0))
+        for i, constraint in enumerate(constraints)
+        if constraint.get("foods") and constraint.get("limit") is not None
+    }
+
+    # each meal's best option in every limited group, and outside of them (None)
+    choices = {}
+    for m in table.chronological():
+        rows = table.valid_rows(m)
+        if not table.rows(m):
+            continue
+        pinned = table.find(table.meals[m], fixed[table.meals[m]]) if fixed and table.meals[m] in fixed else None
+        if pinned is not None:
+            rows = [k for k in rows if k == pinned]
+        best = {}
+        for k in rows:
+            group = next((i for i in food_groups[table.food[k]] if i in limits), None)
+            if group not in best or food_score[table.food[k]] > food_score[table.food[best[group]]]:
+                best[group] = k
+        choices[m] = best
+
+    top = max([food_score[table.food[k]] for best in choices.values() for k in best.values()] + [0])
+    meals = list(choices)
+    groups = list(limits)
+    source, sink = 0, len(meals) + len(groups) + 1
+    group_node = {group: len(meals) + 1 + k for k, group in enumerate(groups)}
+    graph = [[] for _ in range(sink + 1)]
+    to, capacity, cost = [], [], []
+
+    def add_arc(u, v, cap, arc_cost):
+        for a, b, c, w in ((u, v, cap, arc_cost), (v, u, 0, -arc_cost)):
+            graph[a].append(len(to))
+            to.append(b)
+            capacity.append(c)
+            cost.append(w)
+
+    meal_arcs = {}
+    for node, m in enumerate(meals, start=1):
+        add_arc(source, node, 1, 0)
+        for group, k in choices[m].items():
+            meal_arcs[len(to)] = (m, k)
+            add_arc(node, sink if group is None else group_node[group], 1, top - food_score[table.food[k]])
+    for group in groups:
+        add_arc(group_node[group], sink, limits[group], 0)
+
+    build_time = time.perf_counter() - build_start
+    solve_start = time.perf_counter()
+    feasible = min_cost_flow(graph, to, capacity, cost, source, sink, len(meals))
+    solution = {table.meals[m]: table.option(k) for e, (m, k) in meal_arcs.items() if capacity[e] == 0} if feasible else None
+    status = "OPTIMAL" if feasible else "INFEASIBLE"
+    if stats is not None:
+        stats.update(
+            solver="flow",
+            build_time=build_time,
+            solve_time=time.perf_counter() - solve_start,
+            variables=len(to) // 2,
+            constraints=len(groups),
+            status=status,
+            objective=sum(preferences.get(food, 0) for food, *_ in solution.values()) if feasible else None,
+        )
+    return solution, status
+
+
+def solve_with_cp_sat(food_schedule, preferences, constraints, time_limit=None, group_index=None, stats=None,
+                      hints=None, fixed=None, history=None, exclude=None, log_search=False):
+    """
+    CP-SAT model of the schedule, for any mix of limits and gaps. Arguments as in solve_food_schedule.
+
+    Returns:
+        tuple: (solution or None, status name)
+    """
+    from ortools.sat.python import cp_model
+
+    build_start = time.perf_counter()
     model = cp_model.CpModel()
-    
+    table = intern_schedule(food_schedule, preferences)
+    food_score = table.scores(preferences)
+
     # --- 1. Variables & Basic Setup ---
-    day_meals = list(food_schedule.keys())    
+    # Meals are the schedule's indices, gaps are counted in meals, so they need them in chronological order
+    day_meals = table.chronological()
     meal_vars = {}
-    meal_to_options = {}
-    option_to_details = {}
     meal_score_vars = {}
-    
-    for meal, options in food_schedule.items():
-        if options:
-            # Variable for which option is selected (0 to N-1)
-            meal_vars[meal] = model.NewIntVar(0, len(options) - 1, f'meal_{meal}')
-            meal_to_options[meal] = options
-            
-            # Map index back to details for final output
-            for idx, (food, mtype, salon) in enumerate(options):
-                option_to_details[(meal, idx)] = (food, mtype, salon)
-            
+
+    for m, meal in enumerate(table.meals):
+        rows = table.rows(m)
+        if rows:
+            # Variable for which option is selected (0 to N-1), option i being row start[m] + i
+            meal_vars[m] = model.NewIntVar(0, len(rows) - 1, f'meal_{meal}')
+
             # Optimization: Link selection to Score
-            option_scores = [preferences.get(food, 0) for food, _, _ in options]
-            min_s, max_s = (min(option_scores), max(option_scores)) if option_scores else (0, 0)
-            meal_score_vars[meal] = model.NewIntVar(min_s, max_s, f'score_{meal}')
-            model.AddElement(meal_vars[meal], option_scores, meal_score_vars[meal])
+            option_scores = [food_score[table.food[k]] for k in rows]
+            meal_score_vars[m] = model.NewIntVar(min(option_scores), max(option_scores), f'score_{meal}')
+            model.AddElement(meal_vars[m], option_scores, meal_score_vars[m])
+
+    def option_index(meal, option):
+        k = table.find(meal, tuple(option))
+        return None if k is None else k - table.start[table.meal_index[meal]]
+
+    # Warm start from, or pin to, earlier choices that are still offered
+    for meal, option in (hints or {}).items():
+        idx = option_index(meal, option)
+        if idx is not None:
+            model.AddHint(meal_vars[table.meal_index[meal]], idx)
+    for meal, option in (fixed or {}).items():
+        idx = option_index(meal, option)
+        if idx is not None:
+            model.Add(meal_vars[table.meal_index[meal]] == idx)
+    # Every excluded solution must differ from this one in at least one meal
+    for k, solution in enumerate(exclude or []):
+        same = []
+        for meal, option in solution.items():
+            idx = option_index(meal, option)
+            if idx is not None:
+                is_same = model.NewBoolVar(f'x{k}_same_{meal}')
+                model.Add(meal_vars[table.meal_index[meal]] == idx).OnlyEnforceIf(is_same)
+                model.Add(meal_vars[table.meal_index[meal]] != idx).OnlyEnforceIf(is_same.Not())
+                same.append(is_same)
+        if same:
+            model.AddBoolOr([b.Not() for b in same])
 
     # Constraint: Match meal types (sanity check)
-    for (day, mtype), var in meal_vars.items():
-        valid_indices = [
-            i for i, (_, fmtype, _) in enumerate(meal_to_options[(day, mtype)])
-            if fmtype == mtype
-        ]
-        if len(valid_indices) < len(meal_to_options[(day, mtype)]):
+    for m, var in meal_vars.items():
+        valid_indices = [k - table.start[m] for k in table.valid_rows(m)]
+        if len(valid_indices) < len(table.rows(m)):
             model.AddAllowedAssignments([var], [[i] for i in valid_indices])
 
+    # Which options belong to which constraint group, matched once per distinct food name
+    group_index = group_index or ConstraintGroupIndex(constraints)
+    food_groups = table.food_groups(group_index)
+    group_members = {}
+    for m in meal_vars:
+        for k in table.rows(m):
+            for group in food_groups[table.food[k]]:
+                group_members.setdefault(group, {}).setdefault(m, []).append(k - table.start[m])
+
+    history = history or {}
+    past_counts = history.get("counts", {})
+    past_distances = history.get("distances", {})
+
     # We iterate over the list of constraint objects
     for i, constraint in enumerate(constraints):
         target_foods = constraint.get("foods", [])
@@ -69,18 +349,11 @@ def solve_food_schedule(food_schedule, preferences, constraints=[], time_limit=N
         # We'll create a boolean 'is_selected_var' for relevant meals.
         group_match_bools = {} # meal -> BoolVar
         
-        for meal, options in meal_to_options.items():
-            # Find indices of options that match ANY food in the target list
-            matching_indices = []
-            for idx, (food_name, _, _) in enumerate(options):
-                # Check if food_name contains any of the target strings (regex or substring)
-                # Using regex for flexibility (matches "Cheese Pizza" if target is "Pizza")
-                if any(re.search(target, food_name) for target in target_foods):
-                    matching_indices.append(idx)
-            
+        for meal, matching_indices in group_members.get(i, {}).items():
+            options = table.rows(meal)
             if matching_indices:
                 # Create a boolean: Is a matching food selected for this meal?
-                is_match = model.NewBoolVar(f'c{i}_match_{meal}')
+                is_match = model.NewBoolVar(f'c{i}_match_{table.meals[meal]}')
                 
                 # Link main variable to this boolean
                 # Logic: is_match == 1  <==>  meal_vars[meal] IN matching_indices
@@ -105,56 +378,48 @@ def solve_food_schedule(food_schedule, preferences, constraints=[], time_limit=N
                 
                 group_match_bools[meal] = is_match
 
-        # Apply LIMIT: Total occurrences <= limit
+        # Apply LIMIT: Total occurrences <= limit, minus what was already reserved
         if limit is not None and group_match_bools:
-            model.Add(sum(group_match_bools.values()) <= int(limit))
+            model.Add(sum(group_match_bools.values()) <= max(0, int(limit) - past_counts.get(i, 0)))
 
         # Apply GAP: Distance between occurrences >= gap
         if gap is not None and group_match_bools:
-            gap = int(gap)
-            # Iterate through meals by index to check distances
-            # Note: Assuming day_meals is sorted chronologically
-            for j in range(len(day_meals)):
-                for k in range(j + 1, len(day_meals)):
-                    if k - j < gap:
-                        meal_j = day_meals[j]
-                        meal_k = day_meals[k]
-                        
-                        # If both meals define a boolean for this group, constraint them
-                        if meal_j in group_match_bools and meal_k in group_match_bools:
-                            # Cannot select matching foods at both j and k if they are too close
-                            model.Add(group_match_bools[meal_j] + group_match_bools[meal_k] <= 1)
+            add_gap_constraint(model, day_meals, group_match_bools, int(gap))
+            # Also keep the gap to the last match before this schedule
+            distance = past_distances.get(i)
+            if distance is not None:
+                for meal in day_meals[:max(0, int(gap) - distance)]:
+                    if meal in group_match_bools:
+                        model.Add(group_match_bools[meal] == 0)
 
     # --- 3. Objective & Solving ---
     model.Maximize(sum(meal_score_vars.values()))
 
+    build_time = time.perf_counter() - build_start
+
     solver = cp_model.CpSolver()
-    solver.parameters.log_search_progress = True
-    if time_limit:
-        solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.log_search_progress = log_search
+    solver.parameters.num_workers = 1 if len(meal_vars) <= SINGLE_WORKER_MEALS else min(MAX_WORKERS, os.cpu_count() or 1)
+    solver.parameters.max_time_in_seconds = time_limit or DEFAULT_TIME_LIMIT
 
-    print("Solving for optimal schedule...")
+    solve_start = time.perf_counter()
     status = solver.Solve(model)
+    if stats is not None:
+        proto = model.Proto()
+        stats.update(
+            solver="cp-sat",
+            build_time=build_time,
+            solve_time=time.perf_counter() - solve_start,
+            variables=len(proto.variables),
+            constraints=len(proto.constraints),
+            status=solver.StatusName(status),
+            objective=solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None,
+        )
 
-    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        solution = {}
-        total_score = 0
-        print("-" * 40)
-        print(f"Solution Status: {solver.StatusName(status)}")
-        print("Food reservation plan:")
-        
-        for meal in day_meals:
-            if meal in meal_vars:
-                idx = solver.Value(meal_vars[meal])
-                food, mtype, salon = option_to_details[(meal, idx)]
-                solution[meal] = (food, mtype, salon)
-                score = preferences.get(food, 0)
-                total_score += score
-                print(f"  {meal}: {food} ({salon}) [Score: {score}]")
-                
-        print("-" * 40)
-        print(f"Total Score: {total_score}")
-        return solution
-    else:
-        print("No solution found that satisfies all constraints.")
-        return None
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None, solver.StatusName(status)
+    solution = {}
+    for m in day_meals:
+        if m in meal_vars:
+            solution[table.meals[m]] = table.option(table.start[m] + solver.Value(meal_vars[m]))
+    return solution, solver.StatusName(status)
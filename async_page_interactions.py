@@ -0,0 +1,186 @@
+"""
+Async Playwright counterparts of page_interactions, for runs that drive many pages at once.
+They share the in-page scripts and texts of page_interactions, only the awaiting differs.
+"""
+import asyncio
+import time
+
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from page_interactions import (
+    FOODS_BY_DAY_AND_MEAL_JS, NETWORK_HOOK_JS, NO_ALERTS_JS, NO_MEAL_PLAN_TEXT, PROGRAM_STATE_JS,
+    RESERVE_BATCH_JS, RESERVE_CHANGED_JS, RESERVE_CLICK_JS, RESERVE_PACE_MS, RESERVE_RESPONSE_TIMEOUT,
+    RESERVE_SETTLED_JS, SALON_LOADED_JS, SALON_SWITCH_TIMEOUT, SELF_CHOICE_REGEX, SOLD_OUT_TEXT, UNKNOWN_ERROR_TEXT,
+    ReserveBatch, print_reserve_outcome,
+)
+from retry_policy import RETRYABLE_OUTCOMES, SKIP_REASONS, RetryPolicy
+from tracing import span, traced
+from utils import words_presence_regex
+
+
+@traced("login")
+async def login(page, user_info):
+    await page.goto("https://samad.app/login")
+    await page.get_by_text(user_info['university']).click()
+    await page.get_by_text("ورود با نام کاربری و رمز عبور").click()
+    await page.get_by_role("textbox", name="نام کاربری").fill(str(user_info["username"]))
+    await page.get_by_role("textbox", name="رمز عبور").fill(str(user_info["password"]))
+    await page.get_by_role("button", name="ورود").click()
+    await page.get_by_role("button", name="ورود به رابط کاربری دانشجویی").click()
+    await page.get_by_text("رزرو غذا").first.wait_for()
+
+
+@traced("open_reservation_page")
+async def open_reservation_page(page, dashboard_url=None):
+    """
+    Go to next week's reservation program, from the dashboard at `dashboard_url` if given.
+    """
+    if dashboard_url:
+        await page.goto(dashboard_url)
+    await page.get_by_text("رزرو غذا").click()
+    await page.locator("div").filter(has_text=SELF_CHOICE_REGEX).click()
+    await page.get_by_role("button", name="Close").click()
+    await page.get_by_text("هفته بعد").click()
+
+
+@traced("select_salon")
+async def select_salon(page, salon, timeout=SALON_SWITCH_TIMEOUT):
+    await page.evaluate(NETWORK_HOOK_JS)
+    before = await page.evaluate(PROGRAM_STATE_JS, NO_MEAL_PLAN_TEXT)
+    await page.locator(".flaticon-left-chevron").first.click()
+    await page.locator("div.self-list-item").filter(has_text=words_presence_regex(salon)).last.click()
+    try:
+        await page.wait_for_function(
+            SALON_LOADED_JS, arg={'before': before, 'noPlanText': NO_MEAL_PLAN_TEXT, 'idleMs': 150}, timeout=timeout
+        )
+    except PlaywrightTimeoutError:
+        pass
+
+
+@traced("get_foods_by_day_and_meal")
+async def get_foods_by_day_and_meal(page):
+    await page.wait_for_selector('.reserve-program-col', timeout=10000)
+    return await page.evaluate(FOODS_BY_DAY_AND_MEAL_JS)
+
+
+async def wait_for_reservation(page, clicked_at, timeout=RESERVE_RESPONSE_TIMEOUT, grace_ms=300):
+    try:
+        handle = await page.wait_for_function(
+            RESERVE_SETTLED_JS, arg={'clickedAt': clicked_at, 'graceMs': grace_ms}, timeout=timeout
+        )
+        return await handle.json_value()
+    except PlaywrightTimeoutError:
+        print(f"No response from the site after {timeout} ms")
+        return 'timeout'
+
+
+async def wait_for_alerts_to_close(page, timeout=3000):
+    try:
+        await page.wait_for_function(NO_ALERTS_JS, timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
+
+
+async def reserve_food(page, day_identifier, meal_type, food_name, other_options=[], max_retries=7, log_prefix="",
+                       policy=None, salon=None):
+    """
+    Async version of page_interactions.reserve_food.
+
+    Returns:
+        list: (food, outcome) of every food tried, in order
+    """
+    policy = policy or RetryPolicy(max_attempts=max_retries)
+    await page.wait_for_selector('.program-reserve-item', timeout=10000)
+    await page.evaluate(NETWORK_HOOK_JS)
+
+    tried = []
+    for food in [food_name] + list(other_options):
+        outcome = await reserve_with_retries(page, day_identifier, meal_type, food, policy, salon, log_prefix)
+        tried.append((food, outcome))
+        if outcome != 'sold_out':
+            break
+    return tried
+
+
+async def reserve_with_retries(page, day_identifier, meal_type, food_name, policy, salon=None, log_prefix=""):
+    attempt = 0
+    while attempt < policy.max_attempts:
+        blocked = policy.blocked(salon)
+        if blocked:
+            print(f"{log_prefix}✗ Skipping '{food_name}': {SKIP_REASONS[blocked].format(salon=salon)}")
+            return blocked
+        start = time.perf_counter()
+        with span("reserve.attempt", food=food_name, day=day_identifier, meal=meal_type, attempt=attempt + 1) as attempt_span:
+            outcome = await reserve_attempt(page, day_identifier, meal_type, food_name, log_prefix)
+            attempt_span["outcome"] = outcome
+        policy.record(salon, day_identifier, meal_type, food_name, attempt, outcome, time.perf_counter() - start)
+        if outcome not in RETRYABLE_OUTCOMES:
+            return outcome
+        attempt += 1
+        if attempt < policy.max_attempts and not policy.blocked(salon):
+            await asyncio.sleep(policy.delay(attempt - 1))
+    print(f"{log_prefix}✗ Failed after {attempt} attempts")
+    return 'failed'
+
+
+async def reserve_attempt(page, day_identifier, meal_type, food_name, log_prefix=""):
+    result = await page.evaluate(RESERVE_CLICK_JS, {'dayId': day_identifier, 'meal': meal_type, 'foodName': food_name})
+    if not result['success'] and result['action'] in ('day_not_found', 'column_not_found', 'not_found'):
+        print(f"{log_prefix}✗ '{food_name}' ({meal_type}) on '{day_identifier}': {result['action']}")
+        return result['action']
+
+    signal = await wait_for_reservation(page, result['clickedAt']) if 'clickedAt' in result else None
+
+    has_error = False
+    sold_out = False
+    try:
+        alerts = await page.get_by_role("alert").all()
+        for alert in alerts:
+            text = await alert.text_content()
+            if text and UNKNOWN_ERROR_TEXT in text:
+                has_error = True
+                print(f"{log_prefix}Error: {text.strip()}")
+            elif text and SOLD_OUT_TEXT in text:
+                print(f"{log_prefix}Reservation limit reached for '{food_name}' ({meal_type}) on day index {result['dayIndex']}")
+                sold_out = True
+            else:
+                print(f"{log_prefix}Alert: {text.strip()}")
+            await page.get_by_text(text.strip()).click()
+        if alerts:
+            await wait_for_alerts_to_close(page)
+    except PlaywrightError as e:
+        print(f"{log_prefix}Couldn't read the site's alerts: {e}")
+
+    if sold_out:
+        return 'sold_out'
+    if has_error:
+        return 'error'
+    if signal == 'timeout' and not await page.evaluate(RESERVE_CHANGED_JS):
+        print(f"{log_prefix}✗ No answer from the site for '{food_name}' ({meal_type}) on day index {result['dayIndex']}")
+        return 'timeout'
+
+    if result['action'] in ('reserved', 'increased'):
+        print(f"{log_prefix}✓ {result['action'].capitalize()} '{food_name}' ({meal_type}) for day index {result['dayIndex']}")
+    elif result['action'] == 'already_reserved_no_inc':
+        print(f"{log_prefix}! '{food_name}' is already reserved (day index {result['dayIndex']})")
+    return result['action']
+
+
+async def reserve_foods(page, items, max_retries=5, pace_ms=RESERVE_PACE_MS, timeout=RESERVE_RESPONSE_TIMEOUT,
+                        grace_ms=300, log_prefix="", policy=None, salon=None):
+    """
+    Async version of page_interactions.reserve_foods.
+    """
+    policy = policy or RetryPolicy(max_attempts=max_retries)
+    await page.wait_for_selector('.program-reserve-item', timeout=10000)
+    await page.evaluate(NETWORK_HOOK_JS)
+    batch = ReserveBatch(items, policy, salon)
+    while batch.pending and not policy.blocked(salon):
+        started = time.monotonic()
+        with span("reserve.batch", items=len(batch.pending)) as batch_span:
+            answer = await page.evaluate(RESERVE_BATCH_JS, batch.arguments(pace_ms, grace_ms, timeout))
+            batch_span["outcome"] = answer['stopped'] or "done"
+            batch.record(answer['results'], started)
+    for (day, meal_type, food_name), result in zip(items, batch.finish()):
+        print_reserve_outcome(food_name, meal_type, day, result, log_prefix)
+    return [result['outcome'] for result in batch.results]
@@ -0,0 +1,196 @@
+"""
+Run reservations for a group of accounts in one go.
+
+    python batch.py users/ --workers 4 --solvers 2 --report report.json
+
+`users/` holds one folder per account, each with its own personal_info.json, preferences.txt and
+constraints.json (the same files as `info/`). All accounts share one browser, every salon's menu is
+scraped once per university, and the accounts' models are solved in a process pool.
+"""
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from playwright.async_api import async_playwright
+
+from async_page_interactions import open_reservation_page, reserve_foods, select_salon
+from concurrent_scraper import merge_salon_schedules, scrape_salons
+from CSP_solver import solve_food_schedule
+from session_store import start_session_async
+from fallback_plans import BackupPlans, reserve_plan_batched_async
+from retry_policy import RetryPolicy
+from utils import load_config, preference_scores, update_all_foods, validate
+
+
+def discover_users(users_dir):
+    """
+    Returns:
+        list: (name, config folder) of every sub-folder that has a personal_info.json
+    """
+    users = []
+    for name in sorted(os.listdir(users_dir)):
+        path = os.path.join(users_dir, name)
+        if os.path.isfile(os.path.join(path, "personal_info.json")):
+            users.append((name, path))
+    return users
+
+
+def user_salons(user_info):
+    return list(dict.fromkeys(user_info["lunch-salons"] + user_info["dinner-salons"]))
+
+
+async def run_batch(users_dir, workers=4, solver_workers=None, headless=True, update=False, reuse_sessions=True):
+    """
+    Returns:
+        dict: {account name: report entry} with the account's status, planned and reserved counts
+    """
+    users = []
+    report = {}
+    for name, path in discover_users(users_dir):
+        try:
+            user_info, constraints, preferences = load_config(path)
+            validate(user_info)
+        except Exception as e:
+            report[name] = {"status": "failed", "error": f"Bad config: {e}"}
+            continue
+        users.append({"name": name, "user_info": user_info, "constraints": constraints, "preferences": preferences})
+        report[name] = {"status": "pending", "planned": 0, "reserved": 0, "missing_salons": []}
+
+    def fail(user, stage, error):
+        report[user["name"]].update(status="failed", error=f"{stage}: {str(error) or type(error).__name__}")
+
+    semaphore = asyncio.Semaphore(workers)
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=headless)
+
+        # --- log every account in, sharing the browser ---
+        async def log_in(user):
+            async with semaphore:
+                try:
+                    user["context"], user["page"], user["dashboard_url"] = await start_session_async(
+                        browser, user["user_info"], reuse=reuse_sessions
+                    )
+                except Exception as e:
+                    fail(user, "login", e)
+
+        await asyncio.gather(*(log_in(user) for user in users))
+        active = [user for user in users if "context" in user]
+
+        # --- scrape each salon once per university, with one of its accounts ---
+        by_university = {}
+        for user in active:
+            by_university.setdefault(user["user_info"]["university"], []).append(user)
+
+        raw_schedules = {}
+
+        async def scrape_university(university, group):
+            salons = list(dict.fromkeys(s for user in group for s in user_salons(user["user_info"])))
+            scraper = group[0]
+            schedules, _ = await scrape_salons(scraper["context"], salons, scraper["dashboard_url"], concurrency=workers)
+            for salon, raw_schedule in schedules.items():
+                raw_schedules[(university, salon)] = raw_schedule
+
+        await asyncio.gather(*(scrape_university(u, group) for u, group in by_university.items()))
+
+        for user in active:
+            university = user["user_info"]["university"]
+            salons = user_salons(user["user_info"])
+            user["schedule"] = merge_salon_schedules(
+                {s: raw_schedules[(university, s)] for s in salons if (university, s) in raw_schedules}, salons
+            )
+            report[user["name"]]["missing_salons"] = [s for s in salons if (university, s) not in raw_schedules]
+        update_all_foods({food for user in active for foods in user["schedule"].values() for food, *_ in foods})
+
+        # --- solve every account's model in a process pool ---
+        if not update:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=solver_workers) as pool:
+                async def solve(user):
+                    if not user["schedule"]:
+                        report[user["name"]]["status"] = "no_plan"
+                        return
+                    week_foods = {food for foods in user["schedule"].values() for food, *_ in foods}
+                    user["scores"] = preference_scores(week_foods, user["preferences"])
+                    try:
+                        user["solution"] = await loop.run_in_executor(
+                            pool, solve_food_schedule, user["schedule"], user["scores"], user["constraints"]
+                        )
+                    except Exception as e:
+                        fail(user, "solve", e)
+                        return
+                    if user["solution"] is None:
+                        fail(user, "solve", "No solution satisfies the constraints")
+                        return
+                    user["backups"] = BackupPlans(user["schedule"], user["scores"], user["constraints"], user["solution"])
+                    user["backups"].start()
+
+                await asyncio.gather(*(solve(user) for user in active))
+
+        # --- reserve, a bounded number of accounts at a time ---
+        async def reserve(user):
+            entry = report[user["name"]]
+            async with semaphore:
+                try:
+                    page = user["page"]
+                    await open_reservation_page(page, user["dashboard_url"])
+                    entry["planned"] = len(user["solution"])
+                    policy = RetryPolicy(max_attempts=5)
+                    reserved = await reserve_plan_batched_async(
+                        user["backups"], lambda salon: select_salon(page, salon),
+                        lambda salon, items: reserve_foods(
+                            page, items, log_prefix=f"[{user['name']}] ", policy=policy, salon=salon
+                        ),
+                    )
+                    entry["reserved"] = len(reserved)
+                except Exception as e:
+                    fail(user, "reserve", e)
+                    return
+            entry["status"] = "reserved" if entry["reserved"] == entry["planned"] else "partial"
+
+        if not update:
+            await asyncio.gather(*(reserve(user) for user in active if user.get("solution")))
+
+        for user in active:
+            if report[user["name"]]["status"] == "pending":
+                report[user["name"]]["status"] = "updated" if update else "no_plan"
+            await user["context"].close()
+        await browser.close()
+
+    return report
+
+
+def print_report(report):
+    print("-" * 60)
+    print(f"{'account':<20} {'status':<10} {'reserved':>9}  notes")
+    for name, entry in report.items():
+        reserved = f"{entry.get('reserved', 0)}/{entry.get('planned', 0)}"
+        notes = entry.get("error", "")
+        if entry.get("missing_salons"):
+            notes = (notes + " " if notes else "") + "missing: " + ", ".join(entry["missing_salons"])
+        print(f"{name:<20} {entry['status']:<10} {reserved:>9}  {notes}")
+    failed = sum(entry["status"] == "failed" for entry in report.values())
+    print(f"{len(report) - failed} succeeded, {failed} failed")
+    print("-" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("users_dir", help="Folder with one sub-folder of config files per account")
+    parser.add_argument("--workers", type=int, default=4, help="Accounts handled in the browser at the same time")
+    parser.add_argument("--solvers", type=int, default=None, help="Processes solving models (default: number of CPUs)")
+    parser.add_argument("--quiet", action="store_true", help="Don't show the browser window")
+    parser.add_argument("--update", action="store_true", help="Only update all_foods.txt, without making reservations")
+    parser.add_argument("--fresh-login", action="store_true", help="Log in again instead of reusing saved sessions")
+    parser.add_argument("--report", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_batch(
+        args.users_dir, workers=args.workers, solver_workers=args.solvers, headless=args.quiet,
+        update=args.update, reuse_sessions=not args.fresh_login,
+    ))
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
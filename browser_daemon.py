@@ -0,0 +1,151 @@
+"""
+A long-lived Chromium that runs can attach to over CDP, instead of launching a browser each time.
+
+    python browser_daemon.py --port 9333 &
+    python main.py --update --attach 9333
+
+The daemon keeps one persistent context (its profile lives in info/browser_daemon/), so the login
+and the samad.app page opened by the last run stay warm between runs. It checks the browser every
+few seconds and relaunches it when it crashed or stopped answering.
+"""
+import argparse
+import time
+import urllib.request
+
+from playwright.sync_api import sync_playwright
+
+from page_interactions import login
+from race_mode import keep_page_alive
+from session_store import forget_session, is_session_valid, load_session, save_session
+
+DAEMON_PORT = 9333
+DAEMON_PROFILE_DIR = "info/browser_daemon"
+HEALTH_CHECK_INTERVAL = 5
+KEEPALIVE_INTERVAL = 5 * 60
+MAX_RESTART_DELAY = 60
+
+
+def daemon_url(port=DAEMON_PORT):
+    return f"http://127.0.0.1:{port}"
+
+
+def daemon_alive(port=DAEMON_PORT, timeout=1):
+    """
+    Whether a browser answers on the daemon's debugging port.
+    """
+    try:
+        with urllib.request.urlopen(f"{daemon_url(port)}/json/version", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def connect_to_daemon(playwright, port=DAEMON_PORT):
+    """
+    Returns:
+        tuple: (browser, context) of the daemon, or None if it isn't running
+    """
+    if not daemon_alive(port):
+        print(f"No browser daemon on port {port}, launching a browser")
+        return None
+    try:
+        browser = playwright.chromium.connect_over_cdp(daemon_url(port), timeout=5000)
+    except Exception as e:
+        print(f"Couldn't attach to the browser daemon ({e}), launching a browser")
+        return None
+    context = browser.contexts[0] if browser.contexts else browser.new_context()
+    return browser, context
+
+
+def attach_session(context, user_info, reuse=True):
+    """
+    Get a logged-in page in the daemon's context: the reservation page left open by an earlier run
+    if there's one, else the saved dashboard if the context is still logged in, else a new login.
+
+    Returns:
+        tuple: (page, dashboard_url, warm), warm being True if the page is already on the reservation program
+    """
+    session = load_session(user_info)
+    if reuse:
+        for page in context.pages:
+            if "samad.app" in page.url and "/login" not in page.url and page.get_by_text("هفته بعد").count() > 0:
+                print("Reusing the daemon's reservation page")
+                return page, session["dashboard_url"] if session else page.url, True
+    else:
+        context.clear_cookies()
+
+    page = context.pages[0] if context.pages else context.new_page()
+    if reuse and session is not None:
+        if is_session_valid(page, session["dashboard_url"]):
+            print("Reusing the daemon's session")
+            return page, session["dashboard_url"], False
+        forget_session(user_info)
+
+    login(page, user_info)
+    dashboard_url = page.url
+    save_session(user_info, context.storage_state(), dashboard_url)
+    return page, dashboard_url, False
+
+
+def browser_healthy(context, port):
+    try:
+        context.cookies()
+    except Exception:
+        return False
+    return daemon_alive(port, timeout=3)
+
+
+def keep_pages_alive(context):
+    for page in context.pages:
+        if "samad.app" in page.url and page.get_by_text("هفته بعد").count() > 0:
+            keep_page_alive(page)
+
+
+def serve(port=DAEMON_PORT, headless=True, profile_dir=DAEMON_PROFILE_DIR):
+    """
+    Run the browser until interrupted, relaunching it whenever a health check fails.
+    """
+    restart_delay = 1
+    with sync_playwright() as playwright:
+        while True:
+            started = time.monotonic()
+            try:
+                context = playwright.chromium.launch_persistent_context(
+                    profile_dir, headless=headless, args=[f"--remote-debugging-port={port}"]
+                )
+            except Exception as e:
+                print(f"Couldn't launch the browser: {e}")
+                context = None
+
+            if context is not None:
+                print(f"Browser daemon listening on {daemon_url(port)}")
+                last_keepalive = time.monotonic()
+                try:
+                    while browser_healthy(context, port):
+                        if time.monotonic() - last_keepalive >= KEEPALIVE_INTERVAL:
+                            keep_pages_alive(context)
+                            last_keepalive = time.monotonic()
+                        time.sleep(HEALTH_CHECK_INTERVAL)
+                except KeyboardInterrupt:
+                    context.close()
+                    return
+                print("Browser stopped answering, restarting it")
+                try:
+                    context.close()
+                except Exception:
+                    pass
+
+            # back off when the browser keeps dying right after launch
+            if time.monotonic() - started > MAX_RESTART_DELAY:
+                restart_delay = 1
+            time.sleep(restart_delay)
+            restart_delay = min(restart_delay * 2, MAX_RESTART_DELAY)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=DAEMON_PORT, help="Remote debugging port runs attach to")
+    parser.add_argument("--show", action="store_true", help="Show the browser window")
+    parser.add_argument("--profile-dir", default=DAEMON_PROFILE_DIR, help="Folder of the browser's profile")
+    args = parser.parse_args()
+    serve(args.port, headless=not args.show, profile_dir=args.profile_dir)
@@ -0,0 +1,184 @@
+import asyncio
+import socket
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from playwright.async_api import async_playwright, expect
+
+from async_page_interactions import get_foods_by_day_and_meal, open_reservation_page, select_salon
+from menu_changes import PROGRAM_FINGERPRINT_JS
+from page_interactions import NO_MEAL_PLAN_TEXT
+from tracing import span
+from utils import transform_food_schedule
+
+
+async def scrape_salon(page, salon, fingerprints=None):
+    """
+    Scrape one salon's weekly program on an already opened reservation page.
+
+    Args:
+        fingerprints: MenuFingerprints; if the salon's program looks the same as in the last scrape,
+                      its saved schedule is returned instead of extracting it again
+
+    Returns:
+        The raw {day: {meal: [{name, price}]}} schedule, or None if the salon has no meal plan.
+    """
+    with span("scrape.salon", salon=salon) as salon_span:
+        await select_salon(page, salon)
+
+        if await page.get_by_text(NO_MEAL_PLAN_TEXT).count() > 0:
+            salon_span["outcome"] = "no_meal_plan"
+            if fingerprints is not None:
+                fingerprints.update(salon, None, None)
+            return None
+        await expect(page.get_by_text("جزئیات بیشتر").first).to_be_visible()
+        if fingerprints is None:
+            salon_span["outcome"] = "scraped"
+            return await get_foods_by_day_and_meal(page)
+
+        probe = await page.evaluate(PROGRAM_FINGERPRINT_JS)
+        raw_schedule = fingerprints.cached(salon, probe)
+        if raw_schedule is not None:
+            salon_span["outcome"] = "unchanged"
+            return raw_schedule
+        raw_schedule = await get_foods_by_day_and_meal(page)
+        salon_span["outcome"] = "scraped"
+        fingerprints.update(salon, probe, raw_schedule)
+        return raw_schedule
+
+
+async def scrape_salons(context, salons, dashboard_url, concurrency=4, on_salon_done=None, fingerprints=None):
+    """
+    Scrape several salons in parallel using a pool of pages in one logged-in context.
+
+    Every page opens the reservation program once and then serves salons from a shared queue,
+    so at most `concurrency` salons are being loaded at the same time.
+
+    Args:
+        context: Logged-in async Playwright browser context
+        salons: Salon names to scrape
+        dashboard_url: Url of the student dashboard (the page right after login)
+        concurrency: Maximum number of pages working at the same time
+        on_salon_done: Optional callback called with (salon, error) after each salon
+        fingerprints: Optional MenuFingerprints, to skip extracting the salons that didn't change
+
+    Returns:
+        tuple: (raw schedules {salon: raw_schedule}, partial) where partial is True if any
+               salon had no meal plan or failed to load
+    """
+    salons = list(dict.fromkeys(salons))
+    queue = asyncio.Queue()
+    for salon in salons:
+        queue.put_nowait(salon)
+
+    raw_schedules = {}
+    failures = {}
+
+    async def worker():
+        page = await context.new_page()
+        try:
+            await open_reservation_page(page, dashboard_url)
+            while not queue.empty():
+                salon = queue.get_nowait()
+                error = None
+                try:
+                    raw_schedule = await scrape_salon(page, salon, fingerprints)
+                    if raw_schedule is None:
+                        error = "No meal plan defined"
+                    else:
+                        raw_schedules[salon] = raw_schedule
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+                if error:
+                    failures[salon] = error
+                if on_salon_done:
+                    on_salon_done(salon, error)
+        except Exception as e:
+            # The page itself is broken, leave the remaining salons to the other workers
+            failures.setdefault("<page>", str(e) or type(e).__name__)
+        finally:
+            await page.close()
+
+    workers = max(1, min(int(concurrency), len(salons)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    # Salons left in the queue were never scraped because every page failed
+    while not queue.empty():
+        salon = queue.get_nowait()
+        failures[salon] = "Not scraped"
+        if on_salon_done:
+            on_salon_done(salon, failures[salon])
+
+    for salon, error in failures.items():
+        print(f"Failed to get foods from {salon}: {error}")
+
+    return raw_schedules, bool(failures)
+
+
+def merge_salon_schedules(raw_schedules, salons):
+    """
+    Merge raw per-salon schedules into one {(day, meal_type): [(food, meal_type, salon)]} schedule.
+    Salons are merged in the given order so the option order doesn't depend on which page finished first.
+    """
+    overall_food_schedule = defaultdict(list)
+    for salon in dict.fromkeys(salons):
+        if salon not in raw_schedules:
+            continue
+        for meal_day, foods in transform_food_schedule(raw_schedules[salon], salon).items():
+            overall_food_schedule[meal_day].extend(foods)
+    return overall_food_schedule
+
+
+def free_port():
+    """
+    A local port nothing listens on, for the run's browser to open its debugging port on.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _scrape_over_cdp(cdp_url, storage_state, salons, dashboard_url, concurrency, on_salon_done, blocker,
+                           fingerprints):
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.connect_over_cdp(cdp_url, timeout=5000)
+        if storage_state is None:
+            # the daemon's persistent context is logged in, and the run's routes already cover its pages
+            context = browser.contexts[0]
+        else:
+            context = await browser.new_context(storage_state=storage_state)
+            if blocker:
+                await blocker.attach_async(context)
+        try:
+            return await scrape_salons(context, salons, dashboard_url, concurrency, on_salon_done, fingerprints)
+        finally:
+            if storage_state is not None:
+                await context.close()
+            # only disconnects, the browser belongs to the run
+            await browser.close()
+
+
+def scrape_salons_concurrently(cdp_url, salons, dashboard_url, storage_state=None, concurrency=4, on_salon_done=None,
+                               blocker=None, fingerprints=None):
+    """
+    Synchronous entry point for scrape_salons, for callers that use the sync Playwright API.
+
+    The sync API keeps its own event loop on the calling thread, so the async scrape runs on a
+    separate thread that connects to the run's own browser over CDP, instead of launching another one.
+
+    Args:
+        cdp_url: Debugging url of the run's browser (the daemon's, or one launched with --remote-debugging-port)
+        storage_state: Session of the run's context, to scrape in a new context logged in with it;
+                       None scrapes in the browser's default context (the daemon's logged-in one)
+        blocker: Optional resource_blocker.ResourceBlocker, attached to the new context
+
+    Returns:
+        tuple: ({salon: raw_schedule}, partial), see merge_salon_schedules
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(
+            asyncio.run,
+            _scrape_over_cdp(
+                cdp_url, storage_state, salons, dashboard_url, concurrency, on_salon_done, blocker, fingerprints
+            ),
+        ).result()
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import re
+
+FOOD_GROUPS_PATH = "info/food_groups.json"
+
+
+def constraints_key(constraints):
+    """
+    Hash of the constraints' food patterns, the only part of them that group membership depends on.
+    """
+    foods = [constraint.get("foods", []) for constraint in constraints]
+    return hashlib.sha1(json.dumps(foods, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ConstraintGroupIndex:
+    """
+    Maps food names to the indices of the constraints whose `foods` patterns match them.
+
+    Each constraint's patterns are compiled once into a single regex, and every food name is
+    matched only the first time it's seen, no matter in how many salons and days it shows up.
+    """
+
+    def __init__(self, constraints, memberships=None):
+        self.key = constraints_key(constraints)
+        self.patterns = [
+            re.compile("|".join(f"(?:{target})" for target in constraint.get("foods", [])))
+            if constraint.get("foods") else None
+            for constraint in constraints
+        ]
+        self.memberships = memberships or {}
+
+    def groups(self, food_name):
+        """
+        Returns:
+            tuple: Indices of the constraints that food_name belongs to
+        """
+        groups = self.memberships.get(food_name)
+        if groups is None:
+            groups = tuple(i for i, pattern in enumerate(self.patterns) if pattern and pattern.search(food_name))
+            self.memberships[food_name] = groups
+        return groups
+
+    @classmethod
+    def load(cls, constraints, path=FOOD_GROUPS_PATH):
+        """
+        Load the memberships saved for these constraints, or start empty if they changed.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved = {}
+        index = cls(constraints)
+        if saved.get("key") == index.key:
+            index.memberships = {food: tuple(groups) for food, groups in saved.get("memberships", {}).items()}
+        return index
+
+    def save(self, path=FOOD_GROUPS_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"key": self.key, "memberships": self.memberships}, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,378 @@
+import threading
+
+from constraint_index import ConstraintGroupIndex
+from CSP_solver import solve_food_schedule
+from interned_schedule import intern_schedule
+from retry_policy import SKIP_REASONS, SKIPPED_OUTCOMES
+from utils import group_reserves_by_salon
+
+# the food is reserved, whether by this click or an earlier one
+RESERVED_OUTCOMES = ("reserved", "increased", "already_reserved_no_inc")
+# the food isn't on the salon's page, so another food of the meal may not be either
+MISSING_OUTCOMES = ("not_found", "day_not_found", "column_not_found")
+
+
+class BackupPlans:
+    """
+    Keeps the plan satisfying the constraints while foods sell out during reservation.
+
+    - Every meal's options are ranked by preference up front. When a food is sold out, the next
+      ranked option that still fits the limits and gaps, given the other meals' choices, is taken.
+    - If no single option fits, the next best full plans (solved in the background, right after the
+      first one) are tried, then a quick re-solve of the meals that aren't reserved yet.
+    """
+
+    def __init__(self, food_schedule, preferences, constraints, solution, group_index=None, history=None,
+                 reserved=None, top_k=3, time_limit=2):
+        """
+        Args:
+            reserved: {meal: option} reserved by earlier runs, kept as they are and counted against the constraints
+        """
+        self.food_schedule = intern_schedule(food_schedule, preferences)
+        self.preferences = preferences
+        self.constraints = constraints
+        self.group_index = group_index or ConstraintGroupIndex(constraints)
+        self.history = history or {}
+        self.top_k = top_k
+        self.time_limit = time_limit
+
+        table = self.food_schedule
+        self.meals = [table.meals[m] for m in table.chronological()]
+        self.positions = {meal: p for p, meal in enumerate(self.meals)}
+        self.ranked = {meal: [table.option(k) for k in table.ranked(m)] for m, meal in enumerate(table.meals)}
+        self.reserved = {meal: tuple(option) for meal, option in (reserved or {}).items() if meal in self.positions}
+        self.plans = [{**self.reserved, **solution}]
+        self.unavailable = set()
+        self.given_up = set()
+        # {salon: "budget" / "breaker"} of salons the retry policy stopped, their meals are left unreserved
+        self.blocked = {}
+        # (meal, option, "reserved" / "sold_out" / "failed") of every food clicked or requested
+        self.outcomes = []
+        self._set_plan(self.plans[0])
+
+    def _set_plan(self, plan):
+        self.current = {meal: tuple(option) for meal, option in plan.items() if meal not in self.given_up}
+        self.matches = {}
+        for meal, (food, *_) in self.current.items():
+            for i in self.group_index.groups(food):
+                self.matches.setdefault(i, set()).add(self.positions[meal])
+
+    def start(self):
+        """
+        Solve the next best plans in a background thread, so reserving doesn't wait for them.
+        """
+        thread = threading.Thread(target=self._solve_backups, daemon=True)
+        thread.start()
+        return thread
+
+    def _solve_backups(self):
+        reserved = dict(self.reserved)
+        for _ in range(self.top_k):
+            plan = solve_food_schedule(
+                self.food_schedule, self.preferences, self.constraints, time_limit=self.time_limit,
+                group_index=self.group_index, fixed=reserved, history=self.history, exclude=list(self.plans),
+                verbose=False,
+            )
+            if plan is None:
+                break
+            self.plans.append(plan)
+
+    def fits(self, meal, option):
+        """
+        Whether switching `meal` to `option` keeps every limit and gap, with the other meals unchanged.
+        """
+        p = self.positions[meal]
+        past_counts = self.history.get("counts", {})
+        past_distances = self.history.get("distances", {})
+        for i in self.group_index.groups(option[0]):
+            constraint = self.constraints[i]
+            others = self.matches.get(i, set()) - {p}
+            limit = constraint.get("limit")
+            if limit is not None and len(others) + 1 > int(limit) - past_counts.get(i, 0):
+                return False
+            gap = constraint.get("gap")
+            if gap:
+                if any(abs(p - q) < int(gap) for q in others):
+                    return False
+                if i in past_distances and p + past_distances[i] < int(gap):
+                    return False
+        return True
+
+    def alternatives(self, meal, salon=None):
+        """
+        Options that could replace the meal's current choice, best first.
+
+        Args:
+            salon: Only options of this salon
+        """
+        return [
+            option for option in self.ranked.get(meal, [])
+            if option != self.current.get(meal) and (meal, option) not in self.unavailable
+            and option[2] not in self.blocked and (salon is None or option[2] == salon) and self.fits(meal, option)
+        ]
+
+    def fallback_foods(self, meal, salon):
+        """
+        other_options for reserve_food: the meal's alternatives in the salon being reserved from.
+        """
+        return [food for food, *_ in self.alternatives(meal, salon)]
+
+    def pending(self):
+        """
+        Returns:
+            dict: {meal: (food, meal_type, salon)} of the plan that's not reserved yet
+        """
+        return {meal: option for meal, option in self.current.items()
+                if meal not in self.reserved and option[2] not in self.blocked}
+
+    def _switch(self, meal, option):
+        for i in self.group_index.groups(self.current[meal][0]) if meal in self.current else ():
+            self.matches[i].discard(self.positions[meal])
+        self.current[meal] = option
+        for i in self.group_index.groups(option[0]):
+            self.matches.setdefault(i, set()).add(self.positions[meal])
+
+    def record_outcome(self, meal, option, outcome):
+        """
+        Keep the outcome of a food that was clicked or requested. Foods the page didn't show, or that
+        the retry policy skipped, say nothing about the food and stay out of the catalog.
+        """
+        if outcome not in MISSING_OUTCOMES + SKIPPED_OUTCOMES:
+            self.outcomes.append((meal, option, catalog_outcome(outcome)))
+
+    def mark_reserved(self, meal, option, tried=()):
+        """
+        Record what reserve_food ended up reserving.
+
+        Args:
+            tried: (food, outcome) of the foods tried before it
+        """
+        for food, outcome in tried:
+            self.unavailable.add((meal, (food, option[1], option[2])))
+            self.record_outcome(meal, (food, option[1], option[2]), outcome)
+        self._switch(meal, option)
+        self.reserved[meal] = option
+        self.outcomes.append((meal, option, "reserved"))
+
+    def mark_skipped(self, meal, option, outcome, tried=()):
+        """
+        The retry policy stopped the option's salon before `option` was tried: leave the salon's meals
+        unreserved, without counting its foods as failed.
+
+        Args:
+            tried: (food, outcome) of the foods tried before `option`
+        """
+        for food, food_outcome in tried:
+            self.unavailable.add((meal, (food, option[1], option[2])))
+            self.record_outcome(meal, (food, option[1], option[2]), food_outcome)
+        salon = option[2]
+        if salon not in self.blocked:
+            self.blocked[salon] = outcome
+            print(f"Leaving the rest of {salon} unreserved: {SKIP_REASONS[outcome].format(salon=salon)}")
+
+    def mark_failed(self, meal, tried):
+        """
+        None of the tried foods could be reserved: move the meal to another option, or another plan.
+
+        Args:
+            tried: (food, outcome) of the foods that were tried
+
+        Returns:
+            bool: False if the meal had to be given up
+        """
+        salon = self.current[meal][2]
+        for food, outcome in tried:
+            self.unavailable.add((meal, (food, meal[-1], salon)))
+            self.record_outcome(meal, (food, meal[-1], salon), outcome)
+
+        alternatives = self.alternatives(meal)
+        if alternatives:
+            print(f"Switching {meal} to '{alternatives[0][0]}' ({alternatives[0][2]})")
+            self._switch(meal, alternatives[0])
+            return True
+
+        for plan in list(self.plans):
+            if (meal in plan and plan[meal][2] not in self.blocked
+                    and all(plan.get(m) == o for m, o in self.reserved.items())
+                    and not any((m, tuple(o)) in self.unavailable for m, o in plan.items())):
+                print(f"Switching to a backup plan for {meal}")
+                self._set_plan(plan)
+                return True
+
+        print("Re-planning the meals not reserved yet")
+        schedule = {
+            m: [o for o in self.ranked.get(m, [])
+                if (m, o) not in self.unavailable and (m in self.reserved or o[2] not in self.blocked)]
+            for m in self.meals if m not in self.given_up
+        }
+        plan = self._resolve(schedule)
+        if plan is None:
+            # the meal itself may be what makes the rest infeasible
+            self.given_up.add(meal)
+            schedule[meal] = []
+            plan = self._resolve(schedule)
+        self._set_plan(plan if plan is not None else self.current)
+        if meal not in self.current:
+            print(f"✗ No option left for {meal}")
+            self.given_up.add(meal)
+            return False
+        return True
+
+    def give_up(self, meal, option, outcome, tried=()):
+        """
+        Stop reserving the meal without switching it to another food, which could reserve it twice.
+
+        Args:
+            tried: (food, outcome) of the foods tried before `option`
+        """
+        for food, food_outcome in [*tried, (option[0], outcome)]:
+            self.record_outcome(meal, (food, option[1], option[2]), food_outcome)
+        for i in self.group_index.groups(self.current[meal][0]):
+            self.matches[i].discard(self.positions[meal])
+        del self.current[meal]
+        self.given_up.add(meal)
+        print(f"✗ Giving up {meal}: '{option[0]}' {outcome}")
+
+    def _resolve(self, schedule):
+        return solve_food_schedule(
+            schedule, self.preferences, self.constraints, time_limit=self.time_limit,
+            group_index=self.group_index, hints=self.current, fixed=self.reserved, history=self.history,
+            verbose=False,
+        )
+
+
+def catalog_outcome(outcome):
+    """
+    The "reserved", "sold_out" or "failed" a reserve_food or reserve_foods outcome is recorded as.
+    """
+    if outcome in RESERVED_OUTCOMES:
+        return "reserved"
+    return "sold_out" if outcome == "sold_out" else "failed"
+
+
+def mark_outcome(backups, meal, option, outcome, tried=()):
+    """
+    Record the outcome of reserving `option` for the meal, `tried` being (food, outcome) of the foods tried before it.
+    """
+    if outcome in RESERVED_OUTCOMES:
+        backups.mark_reserved(meal, option, tried=tried)
+    elif outcome in SKIPPED_OUTCOMES:
+        backups.mark_skipped(meal, option, outcome, tried=tried)
+    elif outcome in MISSING_OUTCOMES:
+        backups.give_up(meal, option, outcome, tried=tried)
+    else:
+        backups.mark_failed(meal, [*tried, (option[0], outcome)])
+
+
+def mark_tried(backups, meal, meal_type, salon, tried):
+    """
+    Record what reserve_food did for the meal.
+
+    Args:
+        tried: (food, outcome) of every food it tried, as returned by reserve_food
+    """
+    food, outcome = tried[-1]
+    mark_outcome(backups, meal, (food, meal_type, salon), outcome, tried=tried[:-1])
+
+
+def next_reservation(backups, salon, scheduler=None):
+    """
+    Returns:
+        tuple: (meal, option) to reserve next, or None when the plan is reserved
+    """
+    pending = backups.pending()
+    if not pending:
+        return None
+    if scheduler is not None:
+        return scheduler.next(pending, salon)
+    by_salon = group_reserves_by_salon(pending)
+    if salon not in by_salon:
+        salon = next(iter(by_salon))
+    day, meal_type, food_name = by_salon[salon][0]
+    return (day, meal_type), pending[(day, meal_type)]
+
+
+def reserve_plan(backups, select_salon, reserve, scheduler=None):
+    """
+    Reserve the plan salon by salon, switching to backups whenever foods are sold out.
+
+    Args:
+        select_salon: callable(salon) that opens the salon
+        reserve: callable(salon, day, meal_type, food_name, other_options) -> [(food, outcome)] tried, as reserve_food
+        scheduler: ReservationScheduler ordering the reservations by sell-out risk, instead of salon by salon
+
+    Returns:
+        dict: {meal: (food, meal_type, salon)} that got reserved
+    """
+    salon = None
+    while True:
+        step = next_reservation(backups, salon, scheduler)
+        if step is None:
+            return backups.reserved
+        meal, (food_name, meal_type, option_salon) = step
+        if option_salon != salon:
+            salon = option_salon
+            print(f"Reserving foods from {salon}")
+            select_salon(salon)
+        other_options = backups.fallback_foods(meal, salon)
+        mark_tried(backups, meal, meal_type, salon, reserve(salon, meal[0], meal_type, food_name, other_options))
+
+
+def salon_batch(backups, salon, scheduler=None):
+    """
+    The pending reservations of a salon, riskiest first if there's a scheduler.
+
+    Returns:
+        list: [(meal, option)]
+    """
+    batch = [(meal, option) for meal, option in backups.pending().items() if option[2] == salon]
+    if scheduler is not None:
+        batch.sort(key=lambda item: -scheduler.risk(*item))
+    return batch
+
+
+def mark_batch(backups, batch, outcomes):
+    for (meal, option), outcome in zip(batch, outcomes):
+        mark_outcome(backups, meal, option, outcome)
+
+
+def reserve_plan_batched(backups, select_salon, reserve_batch, scheduler=None):
+    """
+    Like reserve_plan, but every salon's pending reservations are made in one reserve_batch call.
+    Meals that failed are switched to their backups and retried in another batch.
+
+    Args:
+        reserve_batch: callable(salon, [(day, meal_type, food_name)]) -> the items' outcomes, as reserve_foods
+
+    Returns:
+        dict: {meal: (food, meal_type, salon)} that got reserved
+    """
+    salon = None
+    while True:
+        step = next_reservation(backups, salon, scheduler)
+        if step is None:
+            return backups.reserved
+        if step[1][2] != salon:
+            salon = step[1][2]
+            print(f"Reserving foods from {salon}")
+            select_salon(salon)
+        batch = salon_batch(backups, salon, scheduler)
+        outcomes = reserve_batch(salon, [(meal[0], meal_type, food) for meal, (food, meal_type, _) in batch])
+        mark_batch(backups, batch, outcomes)
+
+
+async def reserve_plan_batched_async(backups, select_salon, reserve_batch, scheduler=None):
+    """
+    Async version of reserve_plan_batched, for coroutine select_salon and reserve_batch.
+    """
+    salon = None
+    while True:
+        step = next_reservation(backups, salon, scheduler)
+        if step is None:
+            return backups.reserved
+        if step[1][2] != salon:
+            salon = step[1][2]
+            await select_salon(salon)
+        batch = salon_batch(backups, salon, scheduler)
+        outcomes = await reserve_batch(salon, [(meal[0], meal_type, food) for meal, (food, meal_type, _) in batch])
+        mark_batch(backups, batch, outcomes)
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import time
+
+from food_matcher import normalize_food_name
+
+CATALOG_PATH = "info/catalog.sqlite3"
+ALL_FOODS_PATH = "info/all_foods.txt"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    normalized TEXT NOT NULL,
+    first_seen REAL
+);
+CREATE INDEX IF NOT EXISTS foods_normalized ON foods (normalized);
+
+CREATE TABLE IF NOT EXISTS menu (
+    week TEXT NOT NULL,
+    salon TEXT NOT NULL,
+    day TEXT NOT NULL,
+    meal_type TEXT NOT NULL,
+    food_id INTEGER NOT NULL REFERENCES foods (id),
+    price INTEGER,
+    scraped_at REAL,
+    UNIQUE (week, salon, day, meal_type, food_id)
+);
+CREATE INDEX IF NOT EXISTS menu_food ON menu (food_id);
+CREATE INDEX IF NOT EXISTS menu_salon ON menu (salon, week);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    week TEXT NOT NULL,
+    salon TEXT NOT NULL,
+    day TEXT NOT NULL,
+    meal_type TEXT NOT NULL,
+    food_id INTEGER NOT NULL REFERENCES foods (id),
+    outcome TEXT NOT NULL,
+    at REAL
+);
+CREATE INDEX IF NOT EXISTS reservations_food ON reservations (food_id);
+CREATE INDEX IF NOT EXISTS reservations_week ON reservations (week, salon);
+"""
+
+
+def parse_price(price):
+    digits = "".join(c for c in str(price or "").translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹", "0123456789")) if c.isdigit())
+    return int(digits) if digits else None
+
+
+class FoodCatalog:
+    """
+    Every food seen on the site, the menus it was on (salon, week, day, meal and price), and
+    how reserving it went. Backed by a SQLite file; the first time it's opened, the names
+    already collected in all_foods.txt are imported.
+    """
+
+    def __init__(self, path=CATALOG_PATH, all_foods_path=ALL_FOODS_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        if self.db.execute("SELECT COUNT(*) FROM foods").fetchone()[0] == 0 and os.path.exists(all_foods_path):
+            with open(all_foods_path, "r", encoding="utf-8") as f:
+                self.add_foods(line.strip() for line in f if line.strip())
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def food_names(self):
+        return [name for name, in self.db.execute("SELECT name FROM foods ORDER BY id")]
+
+    def add_foods(self, names):
+        """
+        Returns:
+            list: The names that weren't in the catalog yet, in the given order
+        """
+        new = []
+        now = time.time()
+        with self.db:
+            for name in dict.fromkeys(names):
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO foods (name, normalized, first_seen) VALUES (?, ?, ?)",
+                    (name, normalize_food_name(name), now),
+                )
+                if cursor.rowcount:
+                    new.append(name)
+        return new
+
+    def food_id(self, name):
+        row = self.db.execute("SELECT id FROM foods WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self.add_foods([name])
+            row = self.db.execute("SELECT id FROM foods WHERE name = ?", (name,)).fetchone()
+        return row[0]
+
+    def find(self, name):
+        """
+        Known foods written the same way as `name` up to spaces, ZWNJs and Arabic letters.
+        """
+        return [food for food, in self.db.execute(
+            "SELECT name FROM foods WHERE normalized = ? ORDER BY id", (normalize_food_name(name),)
+        )]
+
+    def record_menu(self, week, salon, raw_schedule):
+        """
+        Save a salon's scraped week, {day: {meal_type: [{'name', 'price'}]}}, replacing an earlier scrape of it.
+        """
+        now = time.time()
+        self.add_foods(food["name"] for meals in raw_schedule.values() for foods in meals.values() for food in foods)
+        with self.db:
+            self.db.execute("DELETE FROM menu WHERE week = ? AND salon = ?", (week, salon))
+            for day, meals in raw_schedule.items():
+                for meal_type, foods in meals.items():
+                    for food in foods:
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO menu VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (week, salon, day, meal_type, self.food_id(food["name"]), parse_price(food.get("price")), now),
+                        )
+
+    def record_outcomes(self, week, outcomes):
+        """
+        Args:
+            outcomes: ((day, meal_type), (food, meal_type, salon), outcome) of reserve attempts,
+                      outcome being "reserved", "sold_out" or "failed"
+        """
+        now = time.time()
+        with self.db:
+            for (day, _), (food, meal_type, salon), outcome in outcomes:
+                self.db.execute(
+                    "INSERT INTO reservations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (week, salon, day, meal_type, self.food_id(food), outcome, now),
+                )
+
+    def sell_outs(self):
+        """
+        Returns:
+            dict: {food: (times sold out, reserve attempts)} over every recorded run
+        """
+        return {name: (sold_out, attempts) for name, sold_out, attempts in self.db.execute(
+            "SELECT name, SUM(outcome = 'sold_out'), COUNT(*) FROM reservations JOIN foods ON foods.id = food_id "
+            "GROUP BY food_id"
+        )}
+
+    def menu(self, week, salon=None):
+        """
+        Returns:
+            list: (salon, day, meal_type, food, price) of a week's menus
+        """
+        query = ("SELECT salon, day, meal_type, name, price FROM menu JOIN foods ON foods.id = food_id "
+                 "WHERE week = ?" + (" AND salon = ?" if salon else "") + " ORDER BY salon, menu.rowid")
+        return self.db.execute(query, (week, salon) if salon else (week,)).fetchall()
+
+    def food_history(self, name):
+        """
+        Returns:
+            dict: The food's menu appearances as (week, salon, day, meal_type, price),
+                  and its reservation outcomes as {outcome: count}
+        """
+        food = self.db.execute("SELECT id FROM foods WHERE name = ?", (name,)).fetchone()
+        if food is None:
+            return {"menus": [], "outcomes": {}}
+        menus = self.db.execute(
+            "SELECT week, salon, day, meal_type, price FROM menu WHERE food_id = ? ORDER BY week, salon", food
+        ).fetchall()
+        outcomes = dict(self.db.execute(
+            "SELECT outcome, COUNT(*) FROM reservations WHERE food_id = ? GROUP BY outcome", food
+        ).fetchall())
+        return {"menus": menus, "outcomes": outcomes}
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import re
+
+FOOD_MATCHES_PATH = "info/food_matches.json"
+
+# Arabic letters that show up in typed or copied names in place of the Persian ones
+PERSIAN_LETTERS = str.maketrans({
+    "ي": "ی", "ى": "ی", "ك": "ک", "ة": "ه", "ۀ": "ه", "أ": "ا", "إ": "ا",
+    "\u200c": " ", "\u200e": "", "\u200f": "", "\u0640": "",
+})
+DIACRITICS = re.compile("[\u064b-\u0652\u0670]")
+PUNCTUATION = re.compile(r"[()\[\]{}\-_,.،:/+]+")
+MAX_GRAM = 3
+
+
+def normalize_food_name(name):
+    """
+    Persian letters, no diacritics, punctuation or ZWNJ, single spaces: `زرشک‌پلو (كاله)` -> `زرشک پلو کاله`.
+    """
+    name = DIACRITICS.sub("", name.translate(PERSIAN_LETTERS))
+    return " ".join(PUNCTUATION.sub(" ", name).split())
+
+
+def grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def foods_key(foods):
+    return hashlib.sha1("\n".join(sorted(foods)).encode("utf-8")).hexdigest()
+
+
+class FoodNameMatcher:
+    """
+    Finds the known food names that a short name from preferences.txt refers to.
+
+    A food matches when every word of the short name is part of the food's name, ignoring spaces
+    and ZWNJs, so `زرشک‌پلو`, `زرشک پلو` and `زرشکپلو` all match each other. Candidates come from an
+    inverted index of the names' character n-grams instead of scanning every name, and the ranked
+    matches of each short name are memoized, and saved for as long as the known foods don't change.
+    """
+
+    def __init__(self, foods, matches=None):
+        self.foods = sorted(set(foods))
+        self.food_set = set(self.foods)
+        self.key = foods_key(self.foods)
+        self.matches = matches or {}
+        self.changed = False
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self.compact = {food: normalize_food_name(food).replace(" ", "") for food in self.foods}
+            self.words = {food: set(normalize_food_name(food).split()) for food in self.foods}
+            self._index = {}
+            for food, text in self.compact.items():
+                for n in range(1, MAX_GRAM + 1):
+                    for gram in grams(text, n):
+                        self._index.setdefault(gram, set()).add(food)
+        return self._index
+
+    def _search(self, words):
+        index = self.index
+        found = None
+        for word in words:
+            candidates = set()
+            for gram in grams(word, min(MAX_GRAM, len(word))):
+                candidates = index.get(gram, set()) if not candidates else candidates & index.get(gram, set())
+                if not candidates:
+                    return []
+            found = candidates if found is None else found & candidates
+        return [food for food in found or () if all(word in self.compact[food] for word in words)]
+
+    def candidates(self, short_name):
+        """
+        Returns:
+            list: Matching food names, best first: the exact name, then more whole-word matches,
+                  then shorter names, then alphabetically
+        """
+        normalized = normalize_food_name(short_name)
+        if normalized not in self.matches:
+            words = normalized.split()
+            found = self._search(words) if words else []
+            self.matches[normalized] = sorted(found, key=lambda food: (
+                normalize_food_name(food) != normalized,
+                -len(self.words[food].intersection(words)),
+                len(food),
+                food,
+            ))
+            self.changed = True
+        return self.matches[normalized]
+
+    @classmethod
+    def load(cls, foods, path=FOOD_MATCHES_PATH):
+        """
+        Matcher of the known foods, with the matches saved for the same list of foods.
+        """
+        matcher = cls(foods)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved = {}
+        if saved.get("key") == matcher.key:
+            matcher.matches = saved.get("matches", {})
+        return matcher
+
+    def save(self, path=FOOD_MATCHES_PATH):
+        if not self.changed:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"key": self.key, "matches": self.matches}, f, ensure_ascii=False, indent=1)
+        self.changed = False
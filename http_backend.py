@@ -0,0 +1,236 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from page_interactions import SOLD_OUT_TEXT, UNKNOWN_ERROR_TEXT
+from retry_policy import SKIP_REASONS, RetryPolicy
+from tracing import span, traced
+from utils import next_week_start, words_presence_regex
+
+
+# Paths of the JSON endpoints the samad.app front-end calls, relative to the api url.
+API_ENDPOINTS = {
+    "login": "/oauth/token",
+    "selfs": "/rest/selfs",
+    "programs": "/rest/programs/v2",
+    "reserve": "/rest/reserves/{program_id}/reserve",
+}
+API_URL = "https://api.samad.app"
+
+
+class SamadApiClient:
+    """
+    Talks to the samad.app JSON api directly, over one pooled keep-alive session.
+
+    Produces the same {day: {meal: [{name, price}]}} schedules as get_foods_by_day_and_meal
+    and the same reserve results as reserve_food, without a browser.
+    """
+
+    def __init__(self, api_url=API_URL, endpoints=None, timeout=10, pool_size=8):
+        self.api_url = api_url.rstrip("/")
+        self.endpoints = {**API_ENDPOINTS, **(endpoints or {})}
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.selfs = None
+        # (salon, day, meal_type, food_name) -> program, filled while scraping
+        self.programs = {}
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _url(self, name, **params):
+        return self.api_url + self.endpoints[name].format(**params)
+
+    def _request(self, method, name, path_params=None, **kwargs):
+        response = self.session.request(method, self._url(name, **(path_params or {})), timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    @traced("login")
+    def login(self, user_info):
+        """
+        Get an access token with the account's username and password.
+        """
+        auth = None
+        if user_info.get("api-client-id"):
+            auth = (user_info["api-client-id"], user_info.get("api-client-secret", ""))
+        token = self._request("POST", "login", data={
+            "username": str(user_info["username"]),
+            "password": str(user_info["password"]),
+            "grant_type": "password",
+            "scope": "read write",
+        }, auth=auth)
+        self.session.headers["Authorization"] = f"Bearer {token['access_token']}"
+
+    def get_selfs(self):
+        if self.selfs is None:
+            payload = self._request("GET", "selfs")
+            self.selfs = payload.get("payload", payload)
+        return self.selfs
+
+    def find_self_id(self, salon):
+        pattern = words_presence_regex(salon)
+        # Like the browser's `.last` pick, prefer the last matching salon
+        matches = [s for s in self.get_selfs() if pattern.search(s["name"])]
+        return matches[-1]["id"] if matches else None
+
+    def get_foods_by_day_and_meal(self, salon, week_start=None):
+        """
+        Get a salon's program for next week.
+
+        Returns:
+            {day: {meal_type: [{'name': food_name, 'price': price}]}}, or None if the
+            salon has no meal plan for that week
+        """
+        self_id = self.find_self_id(salon)
+        if self_id is None:
+            raise ValueError(f"Salon '{salon}' not found")
+        week_start = week_start or next_week_start()
+        with span("scrape.salon", salon=salon):
+            payload = self._request("GET", "programs", params={"selfId": self_id, "weekStartDate": week_start.isoformat()})
+        days = payload.get("payload", payload).get("selfWeekPrograms", [])
+
+        result = {}
+        for programs in days:
+            for program in programs:
+                day = program["dayTranslated"].strip()
+                meal = program["mealTypeName"].strip()
+                name = program["foodName"].strip()
+                meals = result.setdefault(day, {'ناهار': [], 'شام': []})
+                meals.setdefault(meal, []).append({'name': name, 'price': str(program.get("price", ""))})
+                self.programs[(salon, day, meal, name)] = {**program, "selfId": self_id}
+        if not any(foods for meals in result.values() for foods in meals.values()):
+            return None
+        return result
+
+    def get_salon_schedules(self, salons, week_start=None):
+        """
+        Get several salons' programs in parallel over the pooled session.
+
+        Returns:
+            tuple: ({salon: raw_schedule}, partial)
+        """
+        salons = list(dict.fromkeys(salons))
+        self.get_selfs()
+        raw_schedules = {}
+        partial = False
+        with ThreadPoolExecutor(max_workers=max(1, min(self.pool_size, len(salons)))) as executor:
+            futures = {salon: executor.submit(self.get_foods_by_day_and_meal, salon, week_start) for salon in salons}
+            for salon, future in futures.items():
+                try:
+                    raw_schedule = future.result()
+                except Exception as e:
+                    print(f"Failed to get foods from {salon}: {e}")
+                    partial = True
+                    continue
+                if raw_schedule is None:
+                    print(f"No meal plan defined for {salon}")
+                    partial = True
+                    continue
+                raw_schedules[salon] = raw_schedule
+        return raw_schedules, partial
+
+    def find_program(self, salon, day, meal_type, food_name):
+        """
+        Find a scraped program, preferring the given salon. Unlike the browser, the api can
+        reserve a fallback food from another salon without switching pages.
+        """
+        program = self.programs.get((salon, day, meal_type, food_name))
+        if program is None:
+            program = next((p for (_, d, m, f), p in self.programs.items() if (d, m, f) == (day, meal_type, food_name)), None)
+        return program
+
+    def reserve_food(self, salon, day_identifier, meal_type, food_name, other_options=[], max_retries=7, policy=None):
+        """
+        Reserve a food through the api. Mirrors page_interactions.reserve_food.
+
+        Returns:
+            list: (food, outcome) of every food tried, in order
+        """
+        policy = policy or RetryPolicy(max_attempts=max_retries)
+        foods = [food_name] + list(other_options)
+        tried = []
+        for i, food in enumerate(foods):
+            outcome = self.reserve_with_retries(salon, day_identifier, meal_type, food, policy)
+            tried.append((food, outcome))
+            if outcome != 'sold_out':
+                break
+            if i + 1 < len(foods):
+                print("Reserving next best option.")
+        return tried
+
+    def reserve_with_retries(self, salon, day_identifier, meal_type, food_name, policy):
+        program = self.find_program(salon, day_identifier, meal_type, food_name)
+        if program is None:
+            print(f"✗ '{food_name}' not found for {meal_type} on {day_identifier}")
+            return 'not_found'
+
+        attempt = 0
+        while attempt < policy.max_attempts:
+            blocked = policy.blocked(salon)
+            if blocked:
+                print(f"✗ Skipping '{food_name}': {SKIP_REASONS[blocked].format(salon=salon)}")
+                return blocked
+            start = time.perf_counter()
+            with span("reserve.attempt", food=food_name, day=day_identifier, meal=meal_type, attempt=attempt + 1) as attempt_span:
+                outcome, status = self.reserve_attempt(program)
+                attempt_span["outcome"] = outcome
+            policy.record(salon, day_identifier, meal_type, food_name, attempt, outcome, time.perf_counter() - start,
+                          status=status)
+            if outcome == 'reserved':
+                print(f"✓ Reserved '{food_name}' ({meal_type}) for {day_identifier}")
+                return outcome
+            if outcome == 'sold_out':
+                print(f"Reservation limit reached for '{food_name}' ({meal_type}) on {day_identifier}")
+                return outcome
+            if outcome == 'failed':
+                print(f"✗ Reservation failed: {status}")
+                return outcome
+            print(f"Error (attempt {attempt + 1}/{policy.max_attempts}): {status}")
+            attempt += 1
+            if attempt < policy.max_attempts and not policy.blocked(salon):
+                time.sleep(policy.delay(attempt - 1))
+
+        print(f"✗ Failed after {attempt} attempts")
+        return 'failed'
+
+    def reserve_attempt(self, program):
+        """
+        Returns:
+            tuple: (outcome, the site's message or status code), outcome being reserved, sold_out, error or failed
+        """
+        try:
+            response = self.session.put(self._url("reserve", program_id=program["programId"]), json={
+                "programId": program["programId"],
+                "foodTypeId": program.get("foodTypeId"),
+                "mealTypeId": program.get("mealTypeId"),
+                "selfId": program["selfId"],
+                "selectedCount": 1,
+            }, timeout=self.timeout)
+        except requests.RequestException as e:
+            return 'error', str(e)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        message = body.get("messageFa") or body.get("message") or ""
+
+        if response.ok and body.get("type", "SUCCESS") == "SUCCESS":
+            return 'reserved', response.status_code
+        if SOLD_OUT_TEXT in message:
+            return 'sold_out', message
+        if UNKNOWN_ERROR_TEXT in message or response.status_code >= 500 or response.status_code == 429:
+            return 'error', message or response.status_code
+        return 'failed', message or response.status_code
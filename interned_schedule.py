@@ -0,0 +1,138 @@
+from array import array
+from collections.abc import Mapping
+
+from utils import chronological_meals
+
+
+class NameTable:
+    """
+    Interns names to small ints. Tables can be shared by the schedules of several weeks or
+    accounts, so a food gets the same id everywhere.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.id(name)
+
+    def id(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def __len__(self):
+        return len(self.names)
+
+
+class InternedSchedule(Mapping):
+    """
+    A {meal: [(food, meal_type, salon)]} schedule stored as arrays of ids.
+
+    Option k of the schedule is (foods.names[food[k]], meal_types.names[meal_type[k]],
+    salons.names[salon[k]]), and meal m's options are the rows start[m] to start[m + 1]. Scores are
+    kept per food id, and every meal's options ranked by score, so the solvers and the reservation
+    loop never hash a food name per option. It still reads like the dict it was made from.
+    """
+
+    def __init__(self, food_schedule, preferences, foods=None, salons=None, meal_types=None):
+        self.foods = foods if foods is not None else NameTable()
+        self.salons = salons if salons is not None else NameTable()
+        self.meal_types = meal_types if meal_types is not None else NameTable()
+        self.meals = list(food_schedule)
+        self.meal_index = {meal: m for m, meal in enumerate(self.meals)}
+        self.start = array("i", [0])
+        self.food = array("i")
+        self.salon = array("i")
+        self.meal_type = array("i")
+        for meal in self.meals:
+            for food, meal_type, salon in food_schedule[meal]:
+                self.food.append(self.foods.id(food))
+                self.meal_type.append(self.meal_types.id(meal_type))
+                self.salon.append(self.salons.id(salon))
+            self.start.append(len(self.food))
+        self.preferences = preferences
+        self.food_score = [preferences.get(name, 0) for name in self.foods.names]
+        self._ranked = {}
+
+    def scores(self, preferences):
+        """
+        Returns:
+            list: Score of every food id under `preferences`
+        """
+        if preferences is self.preferences:
+            return self.food_score
+        return [preferences.get(name, 0) for name in self.foods.names]
+
+    def rows(self, m):
+        return range(self.start[m], self.start[m + 1])
+
+    def option(self, k):
+        return self.foods.names[self.food[k]], self.meal_types.names[self.meal_type[k]], self.salons.names[self.salon[k]]
+
+    def find(self, meal, option):
+        """
+        Returns:
+            int: Row of `option` among the meal's options, or None if it isn't offered
+        """
+        m = self.meal_index.get(meal)
+        food, meal_type, salon = option
+        ids = (self.foods.ids.get(food), self.meal_types.ids.get(meal_type), self.salons.ids.get(salon))
+        if m is None or None in ids:
+            return None
+        for k in self.rows(m):
+            if (self.food[k], self.meal_type[k], self.salon[k]) == ids:
+                return k
+        return None
+
+    def valid_rows(self, m):
+        """
+        The meal's options of the right meal type.
+        """
+        meal_type = self.meal_types.ids.get(self.meals[m][-1])
+        return [k for k in self.rows(m) if self.meal_type[k] == meal_type]
+
+    def ranked(self, m):
+        """
+        The meal's valid options, best first.
+        """
+        if m not in self._ranked:
+            self._ranked[m] = sorted(self.valid_rows(m), key=lambda k: -self.food_score[self.food[k]])
+        return self._ranked[m]
+
+    def chronological(self):
+        """
+        Returns:
+            list: Meal indices in chronological order
+        """
+        return [self.meal_index[meal] for meal in chronological_meals(self.meals)]
+
+    def food_groups(self, group_index):
+        """
+        Returns:
+            list: The constraint groups of every food id, each name matched once
+        """
+        return [group_index.groups(name) for name in self.foods.names]
+
+    def __getitem__(self, meal):
+        return [self.option(k) for k in self.rows(self.meal_index[meal])]
+
+    def __iter__(self):
+        return iter(self.meals)
+
+    def __len__(self):
+        return len(self.meals)
+
+    def __contains__(self, meal):
+        return meal in self.meal_index
+
+
+def intern_schedule(food_schedule, preferences):
+    """
+    The schedule as an InternedSchedule, reusing it if it already is one.
+    """
+    if isinstance(food_schedule, InternedSchedule):
+        return food_schedule
+    return InternedSchedule(food_schedule, preferences)
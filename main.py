@@ -1,59 +1,253 @@
-from collections import defaultdict
-import re
-import time
-from typing import Dict, List
+import contextlib
+from typing import Dict
 from playwright.sync_api import Playwright, sync_playwright, expect
-import json
 from utils import *
 from page_interactions import *
 from CSP_solver import *
+from constraint_index import ConstraintGroupIndex
+from concurrent_scraper import free_port, merge_salon_schedules, scrape_salons_concurrently
+from http_backend import API_URL, SamadApiClient
+from session_store import start_session
+from browser_daemon import DAEMON_PORT, attach_session, connect_to_daemon, daemon_url
+from resource_blocker import ResourceBlocker
+from scrape_benchmark import record_salon
+from race_mode import PhaseTimer, keep_page_alive, parse_target_time, wait_for_meal_plan, wait_until
+from planner import RollingPlanner
+from fallback_plans import BackupPlans, reserve_plan, reserve_plan_batched
+from solution_cache import SolutionCache
+from food_catalog import FoodCatalog
+from interned_schedule import InternedSchedule
+from menu_changes import PROGRAM_FINGERPRINT_JS, MenuFingerprints, schedule_fingerprint
+from reservation_scheduler import SWITCH_PENALTY, ReservationScheduler
+from retry_policy import SALON_BUDGET, RetryPolicy
+import tracing
+from tracing import Profiler, span
 from tqdm import tqdm
 import argparse
 
 
-def run(playwright: Playwright, args) -> None:
-    browser = playwright.chromium.launch(headless=args.quiet)
-    context = browser.new_context()
-    page = context.new_page()
-    page.goto("https://samad.app/login")
-    page.get_by_text(USER_INFO['university']).click()
-    page.get_by_text("ورود با نام کاربری و رمز عبور").click()
-    # page.get_by_role("textbox", name="نام کاربری").click()
-    page.get_by_role("textbox", name="نام کاربری").fill(str(USER_INFO["username"]))
-    # page.get_by_role("textbox", name="رمز عبور").click()
-    page.get_by_role("textbox", name="رمز عبور").fill(str(USER_INFO["password"]))
-    page.get_by_role("button", name="ورود").click()
-    page.get_by_role("button", name="ورود به رابط کاربری دانشجویی").click()
-    page.get_by_text("رزرو غذا").click()
-    # for choosing self
-    page.locator("div").filter(has_text=re.compile(r"^کاله پردیس مرکزی\(بیرون بر\)$")).click()
-    page.get_by_role("button", name="Close").click()
-    page.get_by_text("هفته بعد").click()
-
-    overall_food_schedule : Dict[tuple, List[str]] = defaultdict(list)
+def scrape_salons_sequentially(page, salons, record_dir=None, fingerprints=None):
+    """
+    Args:
+        fingerprints: MenuFingerprints; salons whose program looks the same as in the last scrape
+                      aren't extracted again
+    """
+    raw_schedules : Dict[str, dict] = {}
     partial = False
-    for salon in (pbar := tqdm(set(USER_INFO["lunch-salons"] + USER_INFO["dinner-salons"]))):
+    for salon in (pbar := tqdm(salons)):
         pbar.set_postfix_str(f"Getting foods from {salon}")
-        page.locator(".flaticon-left-chevron").first.click()
-        page.locator("div.self-list-item").filter(has_text=words_presence_regex(salon)).last.click()
-        page.wait_for_timeout(1000)
-
-        # see if food plan is avialable:
-        locator = page.get_by_text("هیچ برنامه ی غذایی ای برای این تاریخ تعریف نشده است")
-        if locator.count() > 0:
-            print(f"No meal plan defined for {salon}")
-            partial = True
-            continue
+        with span("scrape.salon", salon=salon) as salon_span:
+            select_salon(page, salon)
+
+            # see if food plan is avialable:
+            locator = page.get_by_text(NO_MEAL_PLAN_TEXT)
+            if locator.count() > 0:
+                print(f"No meal plan defined for {salon}")
+                salon_span["outcome"] = "no_meal_plan"
+                if fingerprints is not None:
+                    fingerprints.update(salon, None, None)
+                partial = True
+                continue
+            expect(page.get_by_text("جزئیات بیشتر").first).to_be_visible()
+            probe = page.evaluate(PROGRAM_FINGERPRINT_JS) if fingerprints is not None and not record_dir else None
+            salon_schedule = fingerprints.cached(salon, probe) if probe else None
+            if salon_schedule is not None:
+                salon_span["outcome"] = "unchanged"
+            else:
+                # dict{day : dict{meal: foods}}
+                salon_schedule = get_foods_by_day_and_meal(page)
+                salon_span["outcome"] = "scraped"
+                if fingerprints is not None:
+                    fingerprints.update(salon, probe, salon_schedule)
+        if record_dir:
+            record_salon(page, salon, salon_schedule, record_dir)
+        raw_schedules[salon] = salon_schedule
+    return raw_schedules, partial
+
+
+def run(playwright: Playwright, args) -> None:
+    timer = PhaseTimer(parse_target_time(args.at) if args.at else None)
+    try:
+        run_browser(playwright, args, timer)
+    finally:
+        # race mode reports the latencies however the run ended
+        if args.at:
+            timer.report()
+
+
+def run_browser(playwright: Playwright, args, timer) -> None:
+    with timer.phase("login"):
+        daemon = connect_to_daemon(playwright, args.attach) if args.attach else None
+        concurrent = args.concurrency > 1 and not args.record
+        blocker = None
+        if args.block_resources or args.block_dry_run:
+            blocker = ResourceBlocker(allowlist=args.allow_host, dry_run=args.block_dry_run)
+        if daemon is not None:
+            browser, context = daemon
+            cdp_port = args.attach
+            if blocker:
+                blocker.attach(context)
+            page, dashboard_url, warm = attach_session(context, USER_INFO, reuse=not args.fresh_login)
+        else:
+            # concurrent scraping attaches its async pages to this browser over CDP
+            cdp_port = free_port() if concurrent else None
+            browser = playwright.chromium.launch(
+                headless=args.quiet, args=[f"--remote-debugging-port={cdp_port}"] if concurrent else []
+            )
+            context, page, dashboard_url = start_session(
+                browser, USER_INFO, reuse=not args.fresh_login, setup_context=blocker.attach if blocker else None
+            )
+            warm = False
+        if warm:
+            # already on the program, only reload next week's
+            keep_page_alive(page)
+        else:
+            open_reservation_page(page)
+
+    salons = list(dict.fromkeys(USER_INFO["lunch-salons"] + USER_INFO["dinner-salons"]))
+    if args.at:
+        print(f"Logged in, waiting for {args.at}")
+        with timer.phase("wait"):
+            wait_until(timer.reference, keepalive=lambda: keep_page_alive(page))
+        with timer.phase("plan-poll"):
+            if not wait_for_meal_plan(page, salons[0], timeout=args.race_timeout):
+                print(f"No meal plan published for {salons[0]} after {args.race_timeout} s")
+
+    fingerprints = MenuFingerprints(next_week_start().isoformat())
+    with timer.phase("scrape"):
+        if concurrent:
+            pbar = tqdm(total=len(salons), desc="Getting foods")
+            raw_schedules, partial = scrape_salons_concurrently(
+                daemon_url(cdp_port), salons, dashboard_url,
+                storage_state=None if daemon is not None else context.storage_state(),
+                concurrency=args.concurrency,
+                on_salon_done=lambda salon, error: pbar.update(1), blocker=blocker, fingerprints=fingerprints,
+            )
+            pbar.close()
+        else:
+            raw_schedules, partial = scrape_salons_sequentially(
+                page, salons, record_dir=args.record, fingerprints=fingerprints
+            )
+
+    planner = RollingPlanner(cache=None if args.no_cache else SolutionCache())
+    catalog = FoodCatalog()
+    with timer.phase("solve"):
+        plan = plan_reservations(raw_schedules, salons, partial, args, planner, catalog, fingerprints)
+    if plan is None:
+        catalog.close()
+        close_browser(browser, context, blocker, attached=daemon is not None)
+        return
+    backups, week = plan
+
+    def open_salon(salon):
+        select_salon(page, salon)
         expect(page.get_by_text("جزئیات بیشتر").first).to_be_visible()
-        # dict{day : dict{meal: foods}}
-        salon_schedule = get_foods_by_day_and_meal(page)
-        normalized_salon_schedule = transform_food_schedule(salon_schedule, salon)
-        for meal_day, foods in normalized_salon_schedule.items():
-            overall_food_schedule[meal_day].extend(foods)
 
+    scheduler = ReservationScheduler(backups, catalog.sell_outs(), switch_penalty=args.switch_penalty)
+    policy = RetryPolicy(max_attempts=5, salon_budget=args.retry_budget)
+    with timer.phase("reserve"):
+        if args.no_batch:
+            reserved = reserve_plan(
+                backups, open_salon,
+                lambda salon, day, meal_type, food_name, other_options: reserve_food(
+                    page, day, meal_type, food_name, other_options=other_options, policy=policy, salon=salon
+                ),
+                scheduler=scheduler,
+            )
+        else:
+            reserved = reserve_plan_batched(
+                backups, open_salon, lambda salon, items: reserve_foods(page, items, policy=policy, salon=salon),
+                scheduler=scheduler,
+            )
+    save_attempts(policy, args)
+    for meal, option in reserved.items():
+        planner.record_reservation(week, meal, option)
+    planner.save()
+    catalog.record_outcomes(week, backups.outcomes)
+    catalog.close()
+    # ---------------------
+    close_browser(browser, context, blocker, attached=daemon is not None)
+
+
+def save_attempts(policy, args):
+    for salon, outcomes in policy.summary().items():
+        print(f"{salon}: " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())))
+    if args.attempt_log:
+        policy.save(args.attempt_log)
+        print(f"Reserve attempts appended to {args.attempt_log}")
+
+
+def close_browser(browser, context, blocker=None, attached=False):
+    # the daemon's browser and page are left open for the next run
+    if not attached:
+        context.close()
+        browser.close()
+    if blocker:
+        blocker.report()
+        blocker.save()
+
+
+def run_http(args) -> None:
+    with SamadApiClient(args.api_url) as client, FoodCatalog() as catalog:
+        client.login(USER_INFO)
+        salons = list(dict.fromkeys(USER_INFO["lunch-salons"] + USER_INFO["dinner-salons"]))
+        with span("scrape"):
+            raw_schedules, partial = client.get_salon_schedules(salons)
+        fingerprints = MenuFingerprints(next_week_start().isoformat())
+        for salon in salons:
+            # the api's answer is the probe, it's fetched either way
+            probe = schedule_fingerprint(raw_schedules.get(salon))
+            if fingerprints.cached(salon, probe) is None:
+                fingerprints.update(salon, probe, raw_schedules.get(salon))
+
+        planner = RollingPlanner(cache=None if args.no_cache else SolutionCache())
+        with span("plan"):
+            plan = plan_reservations(raw_schedules, salons, partial, args, planner, catalog, fingerprints)
+        if plan is None:
+            return
+        backups, week = plan
+
+        policy = RetryPolicy(max_attempts=5, salon_budget=args.retry_budget)
+        with span("reserve"):
+            reserved = reserve_plan(
+                backups, lambda salon: None,
+                lambda salon, day, meal_type, food_name, other_options: client.reserve_food(
+                    salon, day, meal_type, food_name, other_options=other_options, policy=policy
+                ),
+                scheduler=ReservationScheduler(backups, catalog.sell_outs(), switch_penalty=args.switch_penalty),
+            )
+        save_attempts(policy, args)
+        for meal, option in reserved.items():
+            planner.record_reservation(week, meal, option)
+        planner.save()
+        catalog.record_outcomes(week, backups.outcomes)
+
+
+def plan_reservations(raw_schedules, salons, partial, args, planner, catalog, fingerprints=None):
+    """
+    Record this week's menus in the catalog and solve for the reservations to make.
+
+    Args:
+        fingerprints: MenuFingerprints of the scrape, only the salons that changed are recorded
+
+    Returns:
+        tuple: (BackupPlans around the solution, week), or None if nothing should be reserved
+    """
+    overall_food_schedule = merge_salon_schedules(raw_schedules, salons)
     # convertng preferences to full names
     this_week_foods = {food for foods in overall_food_schedule.values() for food, *_ in foods}
-    update_all_foods(this_week_foods)
+    week = next_week_start().isoformat()
+    changed = raw_schedules
+    if fingerprints is not None:
+        changed = {salon: raw_schedules[salon] for salon in fingerprints.changed_salons() if salon in raw_schedules}
+        print(f"{len(fingerprints.changed_salons())} of {len(salons)} salons changed since the last scrape")
+        if args.diff:
+            fingerprints.write_diff(args.diff)
+        fingerprints.save()
+    update_all_foods({food["name"] for raw_schedule in changed.values() for meals in raw_schedule.values()
+                      for foods in meals.values() for food in foods}, catalog)
+    for salon, raw_schedule in changed.items():
+        catalog.record_menu(week, salon, raw_schedule)
 
     should_reseve = True
     if not overall_food_schedule:
@@ -63,55 +257,75 @@ def run(playwright: Playwright, args) -> None:
         print("Food schedule updated. Exiting as per --update flag.")
         should_reseve = False
     if should_reseve and partial:
-        should_reseve = input("Some salons are missing. Partial reserve? (Y/N)").lower() == 'y'
+        if getattr(args, "at", None):
+            # there's no time to ask in race mode
+            print("Some salons are missing, reserving from the rest.")
+        else:
+            should_reseve = input("Some salons are missing. Partial reserve? (Y/N)").lower() == 'y'
     if not should_reseve:
-        context.close()
-        browser.close()
-        return
+        return None
 
-    preferences = match_short_to_full_foodnames(this_week_foods, PREFERENCES)
-    preferences = {food: len(preferences) - i for i, food in enumerate(preferences)}
+    preferences = preference_scores(this_week_foods, PREFERENCES)
+    overall_food_schedule = InternedSchedule(overall_food_schedule, preferences)
 
     # solving CSP
-    reserve_solution = solve_food_schedule(overall_food_schedule, preferences, CONSTRAINTS)
-    saolon_reserves = defaultdict(list)
-    for (day, meal), (food, meal_type, salon) in reserve_solution.items():
-        saolon_reserves[salon].append((day, meal_type, food))
+    group_index = ConstraintGroupIndex.load(CONSTRAINTS)
+    reserve_solution = planner.plan(week, overall_food_schedule, preferences, CONSTRAINTS, group_index=group_index)
+    group_index.save()
+    if reserve_solution is None:
+        return None
+    planner.save()
+    backups = BackupPlans(
+        overall_food_schedule, preferences, CONSTRAINTS, reserve_solution,
+        group_index=group_index, history=planner.history(week, CONSTRAINTS, group_index),
+        reserved=planner.reservations(week),
+    )
+    backups.start()
+    return backups, week
 
-    for salon, reserves in saolon_reserves.items():
-        pbar.set_postfix_str(f"Getting foods from {salon}")
-        page.locator(".flaticon-left-chevron").first.click()
-        page.locator("div.self-list-item").filter(has_text=words_presence_regex(salon)).last.click()
-        expect(page.get_by_text("جزئیات بیشتر").first).to_be_visible()
-        page.wait_for_timeout(1000)
-
-        for day, meal_type, food_name in reserves:
-            other_options = [
-                f for f, mtype, salon_name in overall_food_schedule[(day, meal_type)]
-                if f != food_name
-            ]
-            other_options.sort(key=lambda f: -preferences.get(f, 0))
-            success = reserve_food(page, day, meal_type, food_name, other_options=other_options, max_retries=5)
-    # ---------------------
-    context.close()
-    browser.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--quiet", action="store_true", help="Don't show the browser window")
     parser.add_argument("--update", action="store_true", help="Only update the all_foods.txt with new foods appended, without making reservations")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of salons to scrape in parallel (1 scrapes them one by one)")
+    parser.add_argument("--backend", choices=["browser", "http"], default="browser", help="Use the browser, or call the samad.app api directly")
+    parser.add_argument("--api-url", default=API_URL, help="Api url for the http backend (e.g. a local mock_server.py)")
+    parser.add_argument("--attach", metavar="PORT", type=int, nargs="?", const=DAEMON_PORT, help="Use the browser of browser_daemon.py on PORT, if it's running")
+    parser.add_argument("--fresh-login", action="store_true", help="Log in again instead of reusing the saved session")
+    parser.add_argument("--at", metavar="HH:MM:SS", help="Race mode: log in ahead of time and start reserving as soon as the plan is published at this time")
+    parser.add_argument("--race-timeout", type=int, default=120, help="Seconds to keep polling for the plan after --at")
+    parser.add_argument("--block-resources", action="store_true", help="Don't load images, media, fonts and third-party hosts")
+    parser.add_argument("--block-dry-run", action="store_true", help="Load everything but report what --block-resources would save")
+    parser.add_argument("--allow-host", action="append", default=[], help="Host (or glob) never blocked by --block-resources, can be repeated")
+    parser.add_argument("--diff", metavar="FILE", help="Write the menu changes since the last scrape to FILE as JSON (- for stdout)")
+    parser.add_argument("--no-cache", action="store_true", help="Solve again even if the same menu was solved before")
+    parser.add_argument("--no-batch", action="store_true", help="Reserve foods one page call at a time instead of a salon's foods at once")
+    parser.add_argument("--switch-penalty", type=float, default=SWITCH_PENALTY, help="How much sell-out risk a salon switch is worth: 0 reserves the riskiest foods first wherever they are, a large value reserves salon by salon")
+    parser.add_argument("--retry-budget", type=int, default=SALON_BUDGET, help="Most reserve attempts made in one salon, retries included")
+    parser.add_argument("--attempt-log", metavar="FILE", help="Append every reserve attempt, with its outcome and timing, to FILE as JSON lines")
+    parser.add_argument("--record", metavar="DIR", help="Save every scraped salon page to DIR, for scrape_benchmark.py")
+    parser.add_argument("--trace", metavar="FILE", help="Save a trace of every phase, salon and reservation attempt to FILE (chrome://tracing format)")
+    parser.add_argument("--metrics", metavar="FILE", help="Write the trace's totals to FILE in Prometheus textfile format")
+    parser.add_argument("--profile", metavar="FILE", nargs="?", const="profile.pstats", help="Profile the run with cProfile and save the stats to FILE")
     args = parser.parse_args()
 
 
-    with open("info/personal_info.json", "r", encoding="utf-8") as file:
-        USER_INFO = json.load(file)
-
-    with open("info/constraints.json", "r", encoding="utf-8") as file:
-        CONSTRAINTS = json.load(file)
-
-    with open("info/preferences.txt", "r", encoding="utf-8") as file:
-        PREFERENCES = [line.strip() for line in file.readlines() if line.strip()]
+    USER_INFO, CONSTRAINTS, PREFERENCES = load_config("info")
 
     validate(USER_INFO)
-    with sync_playwright() as playwright:
-        run(playwright, args)
+    if args.trace or args.metrics:
+        tracing.enable()
+    with Profiler(args.profile) if args.profile else contextlib.nullcontext():
+        if args.backend == "http":
+            run_http(args)
+        else:
+            with sync_playwright() as playwright:
+                run(playwright, args)
+    if args.trace or args.metrics:
+        tracing.TRACER.report()
+    if args.trace:
+        tracing.TRACER.write_trace(args.trace)
+        print(f"Trace saved to {args.trace}")
+    if args.metrics:
+        tracing.TRACER.write_metrics(args.metrics)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+
+MENU_FINGERPRINTS_PATH = "info/menu_fingerprints.json"
+
+# A cheap summary of the shown program: the header (days and dates) and a hash of every item's
+# text, so a salon whose program didn't change can skip get_foods_by_day_and_meal.
+PROGRAM_FINGERPRINT_JS = """
+    () => {
+        const header = Array.from(document.querySelectorAll('.sticky.top-0 .reserve-program-col'))
+            .map(col => col.textContent.trim()).join('|');
+        const items = document.querySelectorAll('.program-reserve-item');
+        // FNV-1a over the items' text
+        let hash = 0x811c9dc5;
+        for (const item of items) {
+            const text = item.textContent;
+            for (let i = 0; i < text.length; i++) {
+                hash = Math.imul(hash ^ text.charCodeAt(i), 0x01000193) >>> 0;
+            }
+            hash = Math.imul(hash ^ 124, 0x01000193) >>> 0;
+        }
+        return `${header}#${items.length}#${hash.toString(16)}`;
+    }
+"""
+
+
+def schedule_fingerprint(raw_schedule):
+    return hashlib.sha1(json.dumps(raw_schedule, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def menu_entries(raw_schedule):
+    return {(day, meal_type, food["name"]) for day, meals in (raw_schedule or {}).items()
+            for meal_type, foods in meals.items() for food in foods}
+
+
+def diff_schedules(old, new):
+    """
+    Returns:
+        dict: {"added": [[day, meal_type, food]], "removed": [[day, meal_type, food]]}
+    """
+    before, after = menu_entries(old), menu_entries(new)
+    return {"added": sorted(map(list, after - before)), "removed": sorted(map(list, before - after))}
+
+
+class MenuFingerprints:
+    """
+    The last scraped program of every salon, with the fingerprint it was scraped under.
+
+    A salon whose probe (PROGRAM_FINGERPRINT_JS, or the fingerprint of the api's answer) is the same
+    as last time for the same week gets its saved schedule back instead of being extracted again, and
+    every scrape is compared with the saved one to tell which (day, meal)s changed.
+    """
+
+    def __init__(self, week, path=MENU_FINGERPRINTS_PATH):
+        self.week = week
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved = {}
+        self.salons = saved.get("salons", {}) if saved.get("week") == week else {}
+        self.changes = {}
+
+    def cached(self, salon, probe):
+        """
+        Returns:
+            dict: The salon's saved raw schedule if `probe` didn't change, else None
+        """
+        entry = self.salons.get(salon)
+        if entry is None or entry["probe"] != probe:
+            return None
+        self.changes[salon] = {"status": "unchanged", "added": [], "removed": []}
+        return entry["schedule"]
+
+    def update(self, salon, probe, raw_schedule):
+        """
+        Save a freshly extracted schedule (None if the salon has no meal plan) and record its diff.
+        """
+        entry = self.salons.get(salon)
+        if entry is None:
+            status = "new" if raw_schedule else "no_plan"
+        elif schedule_fingerprint(entry["schedule"]) == schedule_fingerprint(raw_schedule):
+            status = "unchanged"
+        else:
+            status = "changed" if raw_schedule else "no_plan"
+        self.changes[salon] = {"status": status, **diff_schedules(entry and entry["schedule"], raw_schedule)}
+        self.salons[salon] = {"probe": probe, "schedule": raw_schedule}
+
+    def changed_salons(self):
+        return [salon for salon, change in self.changes.items() if change["status"] != "unchanged"]
+
+    def changed_meals(self):
+        """
+        Returns:
+            list: [day, meal_type] pairs whose foods changed in any salon
+        """
+        return sorted({(day, meal_type) for change in self.changes.values()
+                       for day, meal_type, _ in change["added"] + change["removed"]})
+
+    def diff(self):
+        return {
+            "week": self.week,
+            "changed": bool(self.changed_salons()),
+            "salons": self.changes,
+            "changed_meals": [list(meal) for meal in self.changed_meals()],
+        }
+
+    def write_diff(self, path):
+        """
+        Write diff() as JSON to `path`, or to stdout if it's "-".
+        """
+        text = json.dumps(self.diff(), ensure_ascii=False, indent=2)
+        if path == "-":
+            print(text)
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"week": self.week, "salons": self.salons}, f, ensure_ascii=False)
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the samad.app api, so the http backend can be run and tested offline.
+
+    python mock_server.py --port 8765
+    python main.py --backend http --api-url http://127.0.0.1:8765
+"""
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from page_interactions import SOLD_OUT_TEXT, UNKNOWN_ERROR_TEXT
+
+DAYS = ["شنبه", "یکشنبه", "دوشنبه", "سه‌شنبه", "چهارشنبه"]
+MEALS = ["ناهار", "شام"]
+DEFAULT_SALONS = ["مرکزی آقا", "کاله مرکزی", "سلیمانی"]
+
+
+def generate_menu(salons=DEFAULT_SALONS, foods_path="info/all_foods.txt", options_per_meal=3, seed=0):
+    """
+    Build a deterministic weekly menu {salon: [program]} from the known foods.
+    """
+    try:
+        with open(foods_path, "r", encoding="utf-8") as f:
+            foods = sorted({line.strip() for line in f if line.strip()})
+    except FileNotFoundError:
+        foods = [f"غذای {i}" for i in range(20)]
+    rng = random.Random(seed)
+    menu = {}
+    program_id = 1
+    for salon in salons:
+        programs = []
+        for day in DAYS:
+            for meal_type_id, meal in enumerate(MEALS, start=1):
+                for food in rng.sample(foods, min(options_per_meal, len(foods))):
+                    programs.append({
+                        "programId": program_id,
+                        "dayTranslated": day,
+                        "mealTypeId": meal_type_id,
+                        "mealTypeName": meal,
+                        "foodTypeId": program_id,
+                        "foodName": food,
+                        "price": rng.randrange(10, 90) * 1000,
+                    })
+                    program_id += 1
+        menu[salon] = programs
+    return menu
+
+
+class MockSamadServer:
+    """
+    Serves the api endpoints used by http_backend from an in-memory menu.
+
+    Args:
+        menu: {salon: [program]}, see generate_menu
+        capacity: Reservations allowed per program before it's sold out
+        error_rate: Probability of answering a reservation with the site's unknown-error message
+    """
+
+    def __init__(self, menu=None, host="127.0.0.1", port=0, capacity=None, error_rate=0.0, seed=0):
+        self.menu = menu if menu is not None else generate_menu()
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reserved = {}
+        self.selfs = [{"id": i, "name": name} for i, name in enumerate(self.menu, start=1)]
+        self.programs = {p["programId"]: p for programs in self.menu.values() for p in programs}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reserve(self, program_id):
+        """
+        Returns:
+            tuple: (status code, response body)
+        """
+        with self.lock:
+            if program_id not in self.programs:
+                return 404, {"type": "ERROR", "messageFa": "برنامه یافت نشد"}
+            if self.rng.random() < self.error_rate:
+                return 200, {"type": "ERROR", "messageFa": UNKNOWN_ERROR_TEXT}
+            count = self.reserved.get(program_id, 0)
+            if self.capacity is not None and count >= self.capacity:
+                return 200, {"type": "ERROR", "messageFa": SOLD_OUT_TEXT}
+            self.reserved[program_id] = count + 1
+            return 200, {"type": "SUCCESS", "messageFa": "رزرو با موفقیت انجام شد", "payload": {"programId": program_id}}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _authorized(self):
+                if self.headers.get("Authorization", "").startswith("Bearer "):
+                    return True
+                self._send(401, {"error": "unauthorized"})
+                return False
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                form = parse_qs(self._read_body().decode("utf-8"))
+                if url.path == "/oauth/token" and form.get("username") and form.get("password"):
+                    self._send(200, {"access_token": "mock-token", "token_type": "bearer", "expires_in": 3600})
+                else:
+                    self._send(400, {"error": "invalid_grant"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not self._authorized():
+                    return
+                if url.path == "/rest/selfs":
+                    self._send(200, {"payload": server.selfs})
+                elif url.path == "/rest/programs/v2":
+                    self_id = int(parse_qs(url.query).get("selfId", ["0"])[0])
+                    name = next((s["name"] for s in server.selfs if s["id"] == self_id), None)
+                    programs = server.menu.get(name, [])
+                    days = [[p for p in programs if p["dayTranslated"] == day] for day in DAYS]
+                    self._send(200, {"payload": {"selfWeekPrograms": [d for d in days if d]}})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_PUT(self):
+                url = urlparse(self.path)
+                self._read_body()
+                if not self._authorized():
+                    return
+                parts = url.path.strip("/").split("/")
+                if len(parts) == 4 and parts[:2] == ["rest", "reserves"] and parts[3] == "reserve":
+                    self._send(*server.reserve(int(parts[2])))
+                else:
+                    self._send(404, {"error": "not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--menu", help="JSON file with {salon: [program]}, defaults to a menu generated from info/all_foods.txt")
+    parser.add_argument("--capacity", type=int, default=None, help="Reservations per food before it's sold out")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an unknown-error reply to a reservation")
+    args = parser.parse_args()
+
+    menu = None
+    if args.menu:
+        with open(args.menu, "r", encoding="utf-8") as file:
+            menu = json.load(file)
+    server = MockSamadServer(menu, port=args.port, capacity=args.capacity, error_rate=args.error_rate)
+    print(f"Mock samad api listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
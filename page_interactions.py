@@ -1,87 +1,414 @@
-def get_foods_by_day_and_meal(page):
-    """
-    Extract foods by day and meal.
-    """
-    page.wait_for_selector('.reserve-program-col', timeout=10000)
-    
-    result = page.evaluate("""
-        () => {
-            const result = {};
+import re
+import time
+
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from retry_policy import RETRYABLE_OUTCOMES, SKIP_REASONS, RetryPolicy
+from tracing import add_span, span, traced
+from utils import words_presence_regex
+
+
+# Extracts {day: {meal: [{name, price}]}} from a salon's weekly program.
+FOODS_BY_DAY_AND_MEAL_JS = """
+    () => {
+        const result = {};
+        
+        // Step 1: Get header columns (sticky row)
+        const headerCols = document.querySelectorAll('.sticky.top-0 .reserve-program-col');
+        
+        // Step 2: Get food columns (find the flex div that has food items)
+        let foodCols = [];
+        const allFlexDivs = document.querySelectorAll('.flex');
+        
+        for (const flexDiv of allFlexDivs) {
+            const cols = flexDiv.querySelectorAll(':scope > .reserve-program-col');
+            if (cols.length === 0) continue;
+            
+            // Check if any column has food items
+            let hasFood = false;
+            for (const col of cols) {
+                if (col.querySelector('.program-reserve-item')) {
+                    hasFood = true;
+                    break;
+                }
+            }
+            
+            if (hasFood) {
+                foodCols = Array.from(cols);
+                break;
+            }
+        }
+        
+        // Debug info
+        console.log('Headers found:', headerCols.length);
+        console.log('Food columns found:', foodCols.length);
+        
+        // Step 3: Match them by index
+        for (let i = 0; i < Math.min(headerCols.length, foodCols.length); i++) {
+            // Get day name
+            const dayEl = headerCols[i].querySelector('.week-day-name');
+            if (!dayEl) {
+                console.log('No day name at index', i);
+                continue;
+            }
             
-            // Step 1: Get header columns (sticky row)
-            const headerCols = document.querySelectorAll('.sticky.top-0 .reserve-program-col');
+            const dayName = dayEl.textContent.trim();
+            result[dayName] = { 'ناهار': [], 'شام': [] };
             
-            // Step 2: Get food columns (find the flex div that has food items)
-            let foodCols = [];
-            const allFlexDivs = document.querySelectorAll('.flex');
+            // Get food items in this column
+            const items = foodCols[i].querySelectorAll('.program-reserve-item');
+            console.log('Day:', dayName, 'Items:', items.length);
             
-            for (const flexDiv of allFlexDivs) {
-                const cols = flexDiv.querySelectorAll(':scope > .reserve-program-col');
-                if (cols.length === 0) continue;
+            items.forEach(item => {
+                const mealEl = item.querySelector('.font-bold');
+                const nameEl = item.querySelector('.item-name');
+                const priceEl = item.querySelector('.item-price');
                 
-                // Check if any column has food items
-                let hasFood = false;
-                for (const col of cols) {
-                    if (col.querySelector('.program-reserve-item')) {
-                        hasFood = true;
-                        break;
+                if (mealEl && nameEl) {
+                    const meal = mealEl.textContent.trim();
+                    const name = nameEl.textContent.trim();
+                    const price = priceEl ? priceEl.textContent.trim() : '';
+                    
+                    if (!result[dayName][meal]) {
+                        result[dayName][meal] = [];
                     }
+                    
+                    result[dayName][meal].push({ name: name, price: price });
                 }
-                
-                if (hasFood) {
-                    foodCols = Array.from(cols);
-                    break;
-                }
+            });
+        }
+        
+        return result;
+    }
+"""
+
+
+# Counts the page's XHR/fetch traffic, so waits can follow the network instead of fixed sleeps.
+NETWORK_HOOK_JS = """
+    () => {
+        if (window.__samadNet) return;
+        const net = window.__samadNet = { pending: 0, lastStart: 0, lastEnd: 0, lastWriteEnd: 0 };
+        const begin = () => { net.pending++; net.lastStart = performance.now(); };
+        const end = (method) => {
+            net.pending = Math.max(0, net.pending - 1);
+            net.lastEnd = performance.now();
+            if ((method || 'GET').toUpperCase() !== 'GET') net.lastWriteEnd = net.lastEnd;
+        };
+
+        const open = XMLHttpRequest.prototype.open;
+        XMLHttpRequest.prototype.open = function (method, ...rest) {
+            this.__samadMethod = method;
+            return open.call(this, method, ...rest);
+        };
+        const send = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function (...args) {
+            begin();
+            this.addEventListener('loadend', () => end(this.__samadMethod));
+            return send.apply(this, args);
+        };
+
+        if (window.fetch) {
+            const fetch_ = window.fetch;
+            window.fetch = function (input, init) {
+                begin();
+                const method = (init && init.method) || (input && input.method);
+                return fetch_.apply(this, arguments).finally(() => end(method));
+            };
+        }
+    }
+"""
+
+# Finds the item for (day, meal, food) and clicks its reserve or increase button.
+RESERVE_CLICK_JS = """
+    ({ dayId, meal, foodName }) => {
+        // Remember the clicked item and its content, so its change can be awaited
+        const markPending = (item) => {
+            document.querySelectorAll('[data-samad-pending]').forEach(el => el.removeAttribute('data-samad-pending'));
+            item.dataset.samadPending = '1';
+            item.dataset.samadBefore = item.textContent;
+            delete item.dataset.samadChangedAt;
+            return performance.now();
+        };
+
+        // Find all columns
+        const allCols = document.querySelectorAll('.reserve-program-col');
+        
+        // First 7 columns are day headers, next 7 are food columns
+        const dayHeaders = Array.from(allCols).slice(0, 7);
+        const foodColumns = Array.from(allCols).slice(7, 14);
+        
+        // Find which day index matches
+        let dayIndex = -1;
+        for (let i = 0; i < dayHeaders.length; i++) {
+            const dayText = dayHeaders[i].textContent || '';
+            if (dayText.includes(dayId)) {
+                dayIndex = i;
+                break;
             }
+        }
+        
+        if (dayIndex === -1) {
+            return { success: false, action: 'day_not_found', dayIndex: -1 };
+        }
+        
+        // Get the corresponding food column
+        const foodColumn = foodColumns[dayIndex];
+        if (!foodColumn) {
+            return { success: false, action: 'column_not_found', dayIndex: dayIndex };
+        }
+        
+        // Search for food items only in this column
+        const items = foodColumn.querySelectorAll('.program-reserve-item');
+        
+        for (const item of items) {
+            const mealEl = item.querySelector('.font-bold');
+            const nameEl = item.querySelector('.item-name');
             
-            // Debug info
-            console.log('Headers found:', headerCols.length);
-            console.log('Food columns found:', foodCols.length);
-            
-            // Step 3: Match them by index
-            for (let i = 0; i < Math.min(headerCols.length, foodCols.length); i++) {
-                // Get day name
-                const dayEl = headerCols[i].querySelector('.week-day-name');
-                if (!dayEl) {
-                    console.log('No day name at index', i);
-                    continue;
-                }
-                
-                const dayName = dayEl.textContent.trim();
-                result[dayName] = { 'ناهار': [], 'شام': [] };
-                
-                // Get food items in this column
-                const items = foodCols[i].querySelectorAll('.program-reserve-item');
-                console.log('Day:', dayName, 'Items:', items.length);
+            if (mealEl && nameEl) {
+                const itemMeal = mealEl.textContent.trim();
+                const itemName = nameEl.textContent.trim();
                 
-                items.forEach(item => {
+                if (itemMeal === meal && itemName === foodName) {
+                    // Check if there's a reserve button (not yet reserved)
+                    const reserveBtn = item.querySelector('.button-reserve');
+                    if (reserveBtn) {
+                        const clickedAt = markPending(item);
+                        reserveBtn.click();
+                        return { success: true, action: 'reserved', dayIndex: dayIndex, clickedAt: clickedAt };
+                    }
+                    
+                    // Check if already reserved - look for increment button
+                    const incBtn = item.querySelector('.reserve-inc');
+                    if (incBtn) {
+                        const clickedAt = markPending(item);
+                        incBtn.click();
+                        return { success: true, action: 'increased', dayIndex: dayIndex, clickedAt: clickedAt };
+                    }
+                    
+                    return { success: false, action: 'already_reserved_no_inc', dayIndex: dayIndex };
+                }
+            }
+        }
+        
+        return { success: false, action: 'not_found', dayIndex: dayIndex };
+    }
+"""
+
+# Reserves several items of the open salon in one call: the program is indexed once, then every item
+# is clicked in turn, waiting for the site's reaction and reading its alerts before the next click.
+# It stops early when the salon's attempt budget runs out or enough errors would open its breaker.
+RESERVE_BATCH_JS = """
+    async ({ items, maxRetries, paceMs, graceMs, timeout, soldOutText, errorText, baseDelayMs, maxDelayMs,
+             budget, breakerLeft, breakerWindowMs }) => {
+        const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+        const net = window.__samadNet;
+
+        // First 7 columns are day headers, next 7 are food columns
+        let index = null;
+        const buildIndex = () => {
+            const allCols = Array.from(document.querySelectorAll('.reserve-program-col'));
+            index = { days: allCols.slice(0, 7).map(col => col.textContent || ''), items: new Map() };
+            allCols.slice(7, 14).forEach((col, dayIndex) => {
+                for (const item of col.querySelectorAll('.program-reserve-item')) {
                     const mealEl = item.querySelector('.font-bold');
                     const nameEl = item.querySelector('.item-name');
-                    const priceEl = item.querySelector('.item-price');
-                    
                     if (mealEl && nameEl) {
-                        const meal = mealEl.textContent.trim();
-                        const name = nameEl.textContent.trim();
-                        const price = priceEl ? priceEl.textContent.trim() : '';
-                        
-                        if (!result[dayName][meal]) {
-                            result[dayName][meal] = [];
-                        }
-                        
-                        result[dayName][meal].push({ name: name, price: price });
+                        index.items.set(`${dayIndex}|${mealEl.textContent.trim()}|${nameEl.textContent.trim()}`, item);
                     }
-                });
+                }
+            });
+        };
+        const find = (dayId, meal, foodName) => {
+            const dayIndex = index.days.findIndex(text => text.includes(dayId));
+            return { dayIndex, item: index.items.get(`${dayIndex}|${meal}|${foodName}`) };
+        };
+
+        // Same signals as RESERVE_SETTLED_JS: an alert, the reservation response, or the item's change
+        const settle = async (item, before, clickedAt) => {
+            let changedAt = null;
+            while (performance.now() - clickedAt < timeout) {
+                if (document.querySelector('[role="alert"]')) return 'alert';
+                const now = performance.now();
+                if (net && net.lastWriteEnd > clickedAt && now - net.lastWriteEnd > graceMs) return 'response';
+                if (item.textContent !== before) {
+                    changedAt = changedAt || now;
+                    if (now - changedAt > graceMs) return 'changed';
+                }
+                await sleep(20);
             }
-            
-            return result;
+            return 'timeout';
+        };
+
+        // Closes the alerts, clicking their text as a user would, and waits for them to go
+        const readAlerts = async () => {
+            const texts = [];
+            for (const alert of document.querySelectorAll('[role="alert"]')) {
+                const text = (alert.textContent || '').trim();
+                let target = alert;
+                for (const el of alert.querySelectorAll('*')) {
+                    if ((el.textContent || '').trim() === text) target = el;
+                }
+                texts.push(text);
+                target.click();
+            }
+            const start = performance.now();
+            while (texts.length && document.querySelector('[role="alert"]') && performance.now() - start < 3000) {
+                await sleep(20);
+            }
+            return texts;
+        };
+
+        buildIndex();
+        const batchStart = performance.now();
+        const results = [];
+        const errors = [];
+        let used = 0;
+        let stopped = null;
+        for (const { dayId, meal, foodName, attemptsDone } of items) {
+            if (stopped) break;
+            // tries: [outcome, ms from the batch's start, duration in ms] of every click
+            const result = { outcome: null, dayIndex: -1, attempts: 0, alerts: [], tries: [] };
+            const started = performance.now();
+            for (let attempt = attemptsDone || 0; attempt < maxRetries && !result.outcome; attempt++) {
+                if (used >= budget) {
+                    stopped = 'budget';
+                    break;
+                }
+                let found = find(dayId, meal, foodName);
+                // the site re-rendered the program since it was indexed
+                if (found.item && !found.item.isConnected) {
+                    buildIndex();
+                    found = find(dayId, meal, foodName);
+                }
+                result.dayIndex = found.dayIndex;
+                if (found.dayIndex === -1) {
+                    result.outcome = 'day_not_found';
+                    break;
+                }
+                if (!found.item) {
+                    result.outcome = 'not_found';
+                    break;
+                }
+                const button = found.item.querySelector('.button-reserve') || found.item.querySelector('.reserve-inc');
+                if (!button) {
+                    result.outcome = 'already_reserved_no_inc';
+                    break;
+                }
+                const action = button.classList.contains('button-reserve') ? 'reserved' : 'increased';
+                const before = found.item.textContent;
+                const clickedAt = performance.now();
+                result.attempts++;
+                used++;
+                button.click();
+                result.signal = await settle(found.item, before, clickedAt);
+                const alerts = await readAlerts();
+                result.alerts.push(...alerts);
+                let tried = action;
+                if (alerts.some(text => text.includes(soldOutText))) {
+                    tried = result.outcome = 'sold_out';
+                } else if (alerts.some(text => text.includes(errorText))
+                           || (result.signal === 'timeout' && found.item.textContent === before)) {
+                    // an error, or no answer at all: the click may not have reached the site
+                    tried = alerts.length ? 'error' : 'timeout';
+                    const now = performance.now();
+                    errors.push(now);
+                    while (now - errors[0] > breakerWindowMs) errors.shift();
+                    if (attempt === maxRetries - 1) {
+                        result.outcome = tried === 'error' ? 'failed' : 'timeout';
+                    } else if (errors.length >= breakerLeft) {
+                        // the breaker opens, the rest waits for the next batch
+                        stopped = 'breaker';
+                        result.outcome = 'paused';
+                    } else {
+                        // exponential backoff with full jitter, as RetryPolicy.delay
+                        await sleep(Math.random() * Math.min(maxDelayMs, baseDelayMs * 2 ** attempt));
+                    }
+                } else {
+                    result.outcome = action;
+                }
+                result.tries.push([tried, clickedAt - batchStart, performance.now() - clickedAt]);
+                if (paceMs) await sleep(paceMs);
+            }
+            if (stopped === 'budget' && !result.outcome) result.outcome = 'paused';
+            results.push({ ...result, outcome: result.outcome || 'failed', elapsed: (performance.now() - started) / 1000 });
         }
-    """)
+        return { results, stopped };
+    }
+"""
+
+
+# Whether the item clicked last changed, for clicks the site didn't visibly answer in time
+RESERVE_CHANGED_JS = """
+    () => {
+        const item = document.querySelector('[data-samad-pending]');
+        return !!item && item.textContent !== item.dataset.samadBefore;
+    }
+"""
+
+# Resolves once the clicked item reacted: an alert showed up, the item changed
+# (e.g. its button became `.reserve-inc`), or the reservation request finished.
+RESERVE_SETTLED_JS = """
+    ({ clickedAt, graceMs }) => {
+        if (document.querySelector('[role="alert"]')) return 'alert';
+        // Give the site graceMs after the response or change to show its alert, if it has one
+        const now = performance.now();
+        const net = window.__samadNet;
+        if (net && net.lastWriteEnd > clickedAt && now - net.lastWriteEnd > graceMs) return 'response';
+        const item = document.querySelector('[data-samad-pending]');
+        if (item && item.textContent !== item.dataset.samadBefore) {
+            item.dataset.samadChangedAt = item.dataset.samadChangedAt || now;
+            if (now - item.dataset.samadChangedAt > graceMs) return 'changed';
+        }
+        return false;
+    }
+"""
+
+NO_ALERTS_JS = "() => !document.querySelector('[role=alert]')"
+
+# Snapshot of the shown program, used to detect that a salon switch has been rendered.
+PROGRAM_STATE_JS = """
+    (noPlanText) => ({
+        signature: Array.from(document.querySelectorAll('.program-reserve-item')).map(i => i.textContent.trim()).join('|'),
+        noPlan: document.body.innerText.includes(noPlanText),
+        now: performance.now(),
+    })
+"""
+
+# Resolves once the program differs from `before`, or the salon switch requests are done.
+SALON_LOADED_JS = """
+    ({ before, noPlanText, idleMs }) => {
+        const signature = Array.from(document.querySelectorAll('.program-reserve-item')).map(i => i.textContent.trim()).join('|');
+        if (signature && signature !== before.signature) return 'changed';
+        if (!before.noPlan && document.body.innerText.includes(noPlanText)) return 'no_plan';
+        const net = window.__samadNet;
+        const now = performance.now();
+        if (net && net.lastStart > before.now) {
+            return net.pending === 0 && now - net.lastEnd > idleMs ? 'idle' : false;
+        }
+        // Nothing was requested, the program was served from the SPA's cache
+        return now - before.now > 1000 ? 'quiet' : false;
+    }
+"""
+
+RESERVE_RESPONSE_TIMEOUT = 10000
+SALON_SWITCH_TIMEOUT = 5000
+RESERVE_PACE_MS = 50
+
+
+@traced("get_foods_by_day_and_meal")
+def get_foods_by_day_and_meal(page):
+    """
+    Extract foods by day and meal.
+    """
+    page.wait_for_selector('.reserve-program-col', timeout=10000)
     
+    result = page.evaluate(FOODS_BY_DAY_AND_MEAL_JS)
+
     return result
 
 
 
-def reserve_food(page, day_identifier, meal_type, food_name, other_options=[], max_retries=7):
+def reserve_food(page, day_identifier, meal_type, food_name, other_options=[], max_retries=7, policy=None, salon=None):
     """
     Reserve a food or increase quantity if already reserved (synchronous version).
     Filters by day to find the correct food item.
@@ -91,132 +418,305 @@ def reserve_food(page, day_identifier, meal_type, food_name, other_options=[], m
         day_identifier: Day name or date (e.g., 'سه‌شنبه', 'سهشنبه', or '11 آذر')
         meal_type: 'ناهار' or 'شام'
         food_name: Food name to reserve
-        max_retries: Maximum number of retry attempts
+        other_options: Foods to try in order if this one is sold out
+        max_retries: Maximum number of attempts per food, when no policy is given
+        policy: RetryPolicy deciding on retries, shared by the run's reservations
+        salon: The open salon, for the policy's per-salon budget and circuit breaker
     
     Returns:
-        bool: Success status
+        list: (food, outcome) of every food tried, in order. Only the last one can have been
+              reserved ('reserved' or 'increased'), the ones before it were sold out.
     """
+    policy = policy or RetryPolicy(max_attempts=max_retries)
     page.wait_for_selector('.program-reserve-item', timeout=10000)
-    page.wait_for_timeout(1000)
-    
-    for attempt in range(max_retries):
-        # Find and click the reserve button for the specific day
-        result = page.evaluate("""
-            ({ dayId, meal, foodName }) => {
-                // Find all columns
-                const allCols = document.querySelectorAll('.reserve-program-col');
-                
-                // First 7 columns are day headers, next 7 are food columns
-                const dayHeaders = Array.from(allCols).slice(0, 7);
-                const foodColumns = Array.from(allCols).slice(7, 14);
-                
-                // Find which day index matches
-                let dayIndex = -1;
-                for (let i = 0; i < dayHeaders.length; i++) {
-                    const dayText = dayHeaders[i].textContent || '';
-                    if (dayText.includes(dayId)) {
-                        dayIndex = i;
-                        break;
-                    }
-                }
-                
-                if (dayIndex === -1) {
-                    return { success: false, action: 'day_not_found', dayIndex: -1 };
-                }
-                
-                // Get the corresponding food column
-                const foodColumn = foodColumns[dayIndex];
-                if (!foodColumn) {
-                    return { success: false, action: 'column_not_found', dayIndex: dayIndex };
-                }
-                
-                // Search for food items only in this column
-                const items = foodColumn.querySelectorAll('.program-reserve-item');
-                
-                for (const item of items) {
-                    const mealEl = item.querySelector('.font-bold');
-                    const nameEl = item.querySelector('.item-name');
-                    
-                    if (mealEl && nameEl) {
-                        const itemMeal = mealEl.textContent.trim();
-                        const itemName = nameEl.textContent.trim();
-                        
-                        if (itemMeal === meal && itemName === foodName) {
-                            // Check if there's a reserve button (not yet reserved)
-                            const reserveBtn = item.querySelector('.button-reserve');
-                            if (reserveBtn) {
-                                reserveBtn.click();
-                                return { success: true, action: 'reserved', dayIndex: dayIndex };
-                            }
-                            
-                            // Check if already reserved - look for increment button
-                            const incBtn = item.querySelector('.reserve-inc');
-                            if (incBtn) {
-                                incBtn.click();
-                                return { success: true, action: 'increased', dayIndex: dayIndex };
-                            }
-                            
-                            return { success: false, action: 'already_reserved_no_inc', dayIndex: dayIndex };
-                        }
-                    }
-                }
-                
-                return { success: false, action: 'not_found', dayIndex: dayIndex };
-            }
-        """, {'dayId': day_identifier, 'meal': meal_type, 'foodName': food_name})
-        
-        # Handle errors based on action
-        if not result['success']:
-            if result['action'] == 'day_not_found':
-                print(f"✗ Day '{day_identifier}' not found")
-                return False
-            elif result['action'] == 'column_not_found':
-                print(f"✗ Food column not found for day index {result['dayIndex']}")
-                return False
-            elif result['action'] == 'not_found':
-                print(f"✗ '{food_name}' not found for {meal_type} on day index {result['dayIndex']}")
-                return False
-        
-        # Wait for response
-        page.wait_for_timeout(1500)
-        
-        # Check for error alert
-        has_error = False
-        try:
-            alerts = page.get_by_role("alert").all()
-            for alert in alerts:
-                text = alert.text_content()
-                if text and "خطای نامشخصی رخ داده است" in text:
-                    has_error = True
-                    print(f"Error (attempt {attempt + 1}/{max_retries}): {text.strip()}")
-                elif text and "مورد انتخابی تا حداکثر سقف ممکن، توسط کاربران رزرو شده است!" in text:
-                    print(f"Reservation limit reached for '{food_name}' ({meal_type}) on day index {result['dayIndex']}")
-                    if other_options:
-                        print(f"Reserving next best option.")
-                        return reserve_food(page, day_identifier, meal_type, other_options[0], other_options=other_options[1:], max_retries=3)
-                else:
-                    print(f"Alert: {text.strip()}")
-                page.get_by_text(text.strip()).click()
-        except:
-            pass
-        
-        if has_error:
-            if attempt < max_retries - 1:
-                print(f"Retrying...")
-                page.wait_for_timeout(1000)
-                continue
+    page.evaluate(NETWORK_HOOK_JS)
+
+    foods = [food_name] + list(other_options)
+    tried = []
+    for i, food in enumerate(foods):
+        outcome = reserve_with_retries(page, day_identifier, meal_type, food, policy, salon)
+        tried.append((food, outcome))
+        if outcome != 'sold_out':
+            break
+        if i + 1 < len(foods):
+            print("Reserving next best option.")
+    return tried
+
+
+def reserve_with_retries(page, day_identifier, meal_type, food_name, policy, salon=None):
+    """
+    Attempt to reserve one food until the site gives an answer other than an unknown error,
+    or the policy gives up.
+
+    Returns:
+        str: Outcome of the last attempt (see reserve_attempt), 'failed' when out of retries, or
+             'budget' / 'breaker' when the salon can't be tried anymore
+    """
+    attempt = 0
+    while attempt < policy.max_attempts:
+        blocked = policy.blocked(salon)
+        if blocked:
+            print(f"✗ Skipping '{food_name}': {SKIP_REASONS[blocked].format(salon=salon)}")
+            return blocked
+        start = time.perf_counter()
+        with span("reserve.attempt", food=food_name, day=day_identifier, meal=meal_type, attempt=attempt + 1) as attempt_span:
+            outcome = reserve_attempt(page, day_identifier, meal_type, food_name)
+            attempt_span["outcome"] = outcome
+        policy.record(salon, day_identifier, meal_type, food_name, attempt, outcome, time.perf_counter() - start)
+        if outcome not in RETRYABLE_OUTCOMES:
+            return outcome
+        attempt += 1
+        if attempt < policy.max_attempts and not policy.blocked(salon):
+            delay = policy.delay(attempt - 1)
+            print(f"Retrying in {delay:.1f} s...")
+            time.sleep(delay)
+    print(f"✗ Failed after {attempt} attempts")
+    return 'failed'
+
+
+def reserve_attempt(page, day_identifier, meal_type, food_name):
+    """
+    Click a food's reserve button once and read the site's answer.
+
+    Returns:
+        str: 'reserved', 'increased', 'already_reserved_no_inc', 'sold_out', 'error', 'timeout'
+             (the site didn't answer the click), 'day_not_found', 'column_not_found' or 'not_found'
+    """
+    # Find and click the reserve button for the specific day
+    result = page.evaluate(RESERVE_CLICK_JS, {'dayId': day_identifier, 'meal': meal_type, 'foodName': food_name})
+
+    # Handle errors based on action
+    if result['action'] == 'day_not_found':
+        print(f"✗ Day '{day_identifier}' not found")
+        return result['action']
+    elif result['action'] == 'column_not_found':
+        print(f"✗ Food column not found for day index {result['dayIndex']}")
+        return result['action']
+    elif result['action'] == 'not_found':
+        print(f"✗ '{food_name}' not found for {meal_type} on day index {result['dayIndex']}")
+        return result['action']
+
+    # Wait for the site to respond to the click
+    signal = wait_for_reservation(page, result['clickedAt']) if 'clickedAt' in result else None
+
+    # Check for error alert
+    has_error = False
+    sold_out = False
+    try:
+        alerts = page.get_by_role("alert").all()
+        for alert in alerts:
+            text = alert.text_content()
+            if text and UNKNOWN_ERROR_TEXT in text:
+                has_error = True
+                print(f"Error: {text.strip()}")
+            elif text and SOLD_OUT_TEXT in text:
+                print(f"Reservation limit reached for '{food_name}' ({meal_type}) on day index {result['dayIndex']}")
+                sold_out = True
             else:
-                print(f"✗ Failed after {max_retries} attempts")
-                return False
-        
-        # Success!
-        if result['action'] == 'reserved':
-            print(f"✓ Reserved '{food_name}' ({meal_type}) for day index {result['dayIndex']}")
-        elif result['action'] == 'increased':
-            print(f"✓ Increased quantity for '{food_name}' ({meal_type}) for day index {result['dayIndex']}")
-        elif result['action'] == 'already_reserved_no_inc':
-            print(f"! '{food_name}' is already reserved (day index {result['dayIndex']})")
-        
-        return result['success']
-    
-    return False
+                print(f"Alert: {text.strip()}")
+            page.get_by_text(text.strip()).click()
+        # Closed alerts must be gone before the next click, or they'd be read as its outcome
+        if alerts:
+            wait_for_alerts_to_close(page)
+    except PlaywrightError as e:
+        print(f"Couldn't read the site's alerts: {e}")
+
+    if sold_out:
+        return 'sold_out'
+    if has_error:
+        return 'error'
+    if signal == 'timeout' and not page.evaluate(RESERVE_CHANGED_JS):
+        print(f"✗ No answer from the site for '{food_name}' ({meal_type}) on day index {result['dayIndex']}")
+        return 'timeout'
+
+    # Success!
+    if result['action'] == 'reserved':
+        print(f"✓ Reserved '{food_name}' ({meal_type}) for day index {result['dayIndex']}")
+    elif result['action'] == 'increased':
+        print(f"✓ Increased quantity for '{food_name}' ({meal_type}) for day index {result['dayIndex']}")
+    elif result['action'] == 'already_reserved_no_inc':
+        print(f"! '{food_name}' is already reserved (day index {result['dayIndex']})")
+    return result['action']
+
+
+def reserve_foods(page, items, max_retries=5, pace_ms=RESERVE_PACE_MS, timeout=RESERVE_RESPONSE_TIMEOUT, grace_ms=300,
+                  policy=None, salon=None):
+    """
+    Reserve several foods of the open salon in one round trip to the browser, instead of one
+    reserve_food call (and its waits and alert checks) per food. Sold out foods aren't replaced.
+
+    Args:
+        items: [(day, meal_type, food_name)] in the order to reserve them
+        pace_ms: Pause after every click, so the site isn't flooded
+        policy: RetryPolicy whose attempts and backoff the page follows, and that gets the items' records
+
+    Returns:
+        list: Every item's outcome: 'reserved', 'increased', 'sold_out', 'failed',
+              'already_reserved_no_inc', 'day_not_found' or 'not_found'
+    """
+    policy = policy or RetryPolicy(max_attempts=max_retries)
+    page.wait_for_selector('.program-reserve-item', timeout=10000)
+    page.evaluate(NETWORK_HOOK_JS)
+    batch = ReserveBatch(items, policy, salon)
+    # the page stops when the salon's budget runs out or its breaker opens, the rest is skipped
+    while batch.pending and not policy.blocked(salon):
+        started = time.monotonic()
+        with span("reserve.batch", items=len(batch.pending)) as batch_span:
+            answer = page.evaluate(RESERVE_BATCH_JS, batch.arguments(pace_ms, grace_ms, timeout))
+            batch_span["outcome"] = answer['stopped'] or "done"
+            batch.record(answer['results'], started)
+    for (day, meal_type, food_name), result in zip(items, batch.finish()):
+        print_reserve_outcome(food_name, meal_type, day, result)
+    return [result['outcome'] for result in batch.results]
+
+
+class ReserveBatch:
+    """
+    The items of a reserve_foods call across the RESERVE_BATCH_JS runs it takes, feeding every click
+    the page made to the RetryPolicy as if it had been made from here.
+    """
+
+    def __init__(self, items, policy, salon):
+        self.items = items
+        self.policy = policy
+        self.salon = salon
+        self.results = [None] * len(items)
+        self.attempts = [0] * len(items)
+        self.alerts = [[] for _ in items]
+        self.pending = list(range(len(items)))
+
+    def arguments(self, pace_ms, grace_ms, timeout):
+        policy = self.policy
+        return {
+            'items': [{'dayId': day, 'meal': meal_type, 'foodName': food_name, 'attemptsDone': self.attempts[i]}
+                      for i in self.pending for day, meal_type, food_name in [self.items[i]]],
+            'maxRetries': policy.max_attempts, 'paceMs': pace_ms, 'graceMs': grace_ms, 'timeout': timeout,
+            'soldOutText': SOLD_OUT_TEXT, 'errorText': UNKNOWN_ERROR_TEXT,
+            'baseDelayMs': policy.base_delay * 1000, 'maxDelayMs': policy.max_delay * 1000,
+            'budget': policy.remaining(self.salon), 'breakerLeft': policy.breaker_left(self.salon),
+            'breakerWindowMs': policy.breaker_window * 1000,
+        }
+
+    def record(self, results, started):
+        """
+        Record the clicks of one RESERVE_BATCH_JS run that started at time.monotonic() `started`,
+        with a reserve.attempt span for each, as reserve_food has.
+        """
+        perf_offset = time.perf_counter() - time.monotonic()
+        for i, result in zip(self.pending, results):
+            day, meal_type, food_name = self.items[i]
+            for outcome, offset_ms, elapsed_ms in result['tries']:
+                at = started + offset_ms / 1000
+                self.policy.record(self.salon, day, meal_type, food_name, self.attempts[i], outcome, elapsed_ms / 1000,
+                                   at=at)
+                self.attempts[i] += 1
+                add_span("reserve.attempt", at + perf_offset, elapsed_ms / 1000, food=food_name, day=day,
+                         meal=meal_type, attempt=self.attempts[i], outcome=outcome)
+            self.alerts[i] += result['alerts']
+            if result['outcome'] != 'paused':
+                self.results[i] = {**result, 'attempts': self.attempts[i], 'alerts': self.alerts[i]}
+        self.pending = [i for i in self.pending if self.results[i] is None]
+
+    def finish(self):
+        """
+        Returns:
+            list: Every item's result, the ones left when the salon got blocked as 'budget' or 'breaker'
+        """
+        outcome = self.policy.blocked(self.salon) or 'failed'
+        for i in self.pending:
+            self.results[i] = {'outcome': outcome, 'dayIndex': -1, 'attempts': self.attempts[i], 'alerts': self.alerts[i]}
+        self.pending = []
+        return self.results
+
+
+def print_reserve_outcome(food_name, meal_type, day, result, log_prefix=""):
+    outcome = result['outcome']
+    if outcome in ('reserved', 'increased'):
+        print(f"{log_prefix}✓ {outcome.capitalize()} '{food_name}' ({meal_type}) for {day}")
+    elif outcome == 'sold_out':
+        print(f"{log_prefix}Reservation limit reached for '{food_name}' ({meal_type}) on {day}")
+    elif outcome == 'failed':
+        print(f"{log_prefix}✗ '{food_name}' ({meal_type}) on {day} failed after {result['attempts']} attempts: {' | '.join(result['alerts'])}")
+    elif outcome == 'already_reserved_no_inc':
+        print(f"{log_prefix}! '{food_name}' is already reserved ({day})")
+    elif outcome == 'timeout':
+        print(f"{log_prefix}✗ No answer from the site for '{food_name}' ({meal_type}) on {day}")
+    elif outcome in SKIP_REASONS:
+        print(f"{log_prefix}✗ Skipped '{food_name}' ({meal_type}) on {day}: {SKIP_REASONS[outcome].format(salon='the salon')}")
+    else:
+        print(f"{log_prefix}✗ '{food_name}' ({meal_type}) on '{day}': {outcome}")
+
+
+def wait_for_reservation(page, clicked_at, timeout=RESERVE_RESPONSE_TIMEOUT, grace_ms=300):
+    """
+    Wait until the site reacts to a reserve click, instead of sleeping a fixed time.
+
+    Returns:
+        str: The signal that ended the wait ('alert', 'changed', 'response'), or 'timeout'
+    """
+    try:
+        handle = page.wait_for_function(
+            RESERVE_SETTLED_JS, arg={'clickedAt': clicked_at, 'graceMs': grace_ms}, timeout=timeout
+        )
+        return handle.json_value()
+    except PlaywrightTimeoutError:
+        print(f"No response from the site after {timeout} ms")
+        return 'timeout'
+
+
+def wait_for_alerts_to_close(page, timeout=3000):
+    try:
+        page.wait_for_function(NO_ALERTS_JS, timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
+
+
+NO_MEAL_PLAN_TEXT = "هیچ برنامه ی غذایی ای برای این تاریخ تعریف نشده است"
+UNKNOWN_ERROR_TEXT = "خطای نامشخصی رخ داده است"
+SOLD_OUT_TEXT = "مورد انتخابی تا حداکثر سقف ممکن، توسط کاربران رزرو شده است!"
+SELF_CHOICE_REGEX = re.compile(r"^کاله پردیس مرکزی\(بیرون بر\)$")
+
+
+@traced("login")
+def login(page, user_info):
+    """
+    Log in to samad.app and enter the student dashboard.
+    """
+    page.goto("https://samad.app/login")
+    page.get_by_text(user_info['university']).click()
+    page.get_by_text("ورود با نام کاربری و رمز عبور").click()
+    page.get_by_role("textbox", name="نام کاربری").fill(str(user_info["username"]))
+    page.get_by_role("textbox", name="رمز عبور").fill(str(user_info["password"]))
+    page.get_by_role("button", name="ورود").click()
+    page.get_by_role("button", name="ورود به رابط کاربری دانشجویی").click()
+    # the dashboard is loaded once its menu shows up
+    page.get_by_text("رزرو غذا").first.wait_for()
+
+
+@traced("open_reservation_page")
+def open_reservation_page(page):
+    """
+    Go from the dashboard to next week's reservation program.
+    """
+    page.get_by_text("رزرو غذا").click()
+    # for choosing self
+    page.locator("div").filter(has_text=SELF_CHOICE_REGEX).click()
+    page.get_by_role("button", name="Close").click()
+    page.get_by_text("هفته بعد").click()
+
+
+@traced("select_salon")
+def select_salon(page, salon, timeout=SALON_SWITCH_TIMEOUT):
+    """
+    Switch the reservation program to the given salon and wait until its program is rendered.
+    """
+    page.evaluate(NETWORK_HOOK_JS)
+    before = page.evaluate(PROGRAM_STATE_JS, NO_MEAL_PLAN_TEXT)
+    page.locator(".flaticon-left-chevron").first.click()
+    page.locator("div.self-list-item").filter(has_text=words_presence_regex(salon)).last.click()
+    try:
+        page.wait_for_function(
+            SALON_LOADED_JS, arg={'before': before, 'noPlanText': NO_MEAL_PLAN_TEXT, 'idleMs': 150}, timeout=timeout
+        )
+    except PlaywrightTimeoutError:
+        pass
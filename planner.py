@@ -0,0 +1,166 @@
+import datetime
+import hashlib
+import json
+
+from constraint_index import ConstraintGroupIndex
+from CSP_solver import solve_food_schedule
+from utils import chronological_meals
+
+PLAN_HISTORY_PATH = "info/plan_history.json"
+
+
+def meal_id(meal):
+    return json.dumps(list(meal), ensure_ascii=False)
+
+
+def fingerprint(value):
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def week_date(week):
+    try:
+        return datetime.date.fromisoformat(week)
+    except ValueError:
+        return None
+
+
+class RollingPlanner:
+    """
+    Plans week after week, remembering what was planned and reserved in earlier weeks.
+
+    - `limit`s of constraints with a `"period": n` (in weeks) also count the matches reserved in
+      the previous n-1 weeks, and `gap`s are kept across the boundary with the previous week.
+    - Re-planning a week starts the solver from the week's previous plan. If only a few meals'
+      options changed, only the meals within a gap's reach of them are re-solved, the rest are
+      kept as planned. If nothing changed, the previous plan is returned without solving.
+    - Reservations recorded for the week are kept fixed, and left out of the plan returned.
+
+    Weeks are identified by the date their week starts on (see utils.next_week_start).
+    """
+
+    def __init__(self, path=PLAN_HISTORY_PATH, cache=None):
+        self.path = path
+        self.cache = cache
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.weeks = json.load(f).get("weeks", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.weeks = {}
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"weeks": self.weeks}, f, ensure_ascii=False, indent=1)
+        if self.cache is not None:
+            self.cache.flush()
+
+    def _choices(self, week, kind):
+        entry = self.weeks.get(week, {})
+        return {tuple(json.loads(m)): tuple(option) for m, option in entry.get(kind, {}).items()}
+
+    def reserved_or_planned(self, week):
+        """
+        What was eaten in a past week: its recorded reservations, or its plan if none were recorded.
+        """
+        return self._choices(week, "reserved") or self._choices(week, "plan")
+
+    def reservations(self, week):
+        return self._choices(week, "reserved")
+
+    def record_reservation(self, week, meal, option):
+        entry = self.weeks.setdefault(week, {})
+        entry.setdefault("reserved", {})[meal_id(meal)] = list(option)
+
+    def history(self, week, constraints, group_index):
+        """
+        Carry-over from earlier weeks for solve_food_schedule's `history` argument.
+        """
+        counts = {}
+        distances = {}
+        current = week_date(week)
+        previous_weeks = sorted(w for w in self.weeks if w < week)
+        for i, constraint in enumerate(constraints):
+            period = int(constraint.get("period", 1))
+            if constraint.get("limit") is not None and period > 1:
+                for past in previous_weeks[-(period - 1):]:
+                    past_date = week_date(past)
+                    if current and past_date and (current - past_date).days >= 7 * period:
+                        continue
+                    counts[i] = counts.get(i, 0) + sum(
+                        i in group_index.groups(food) for food, *_ in self.reserved_or_planned(past).values()
+                    )
+
+        if previous_weeks:
+            last = previous_weeks[-1]
+            last_date = week_date(last)
+            # gaps only reach into the week right before this one
+            if not (current and last_date and (current - last_date).days > 7):
+                eaten = self.reserved_or_planned(last)
+                meals = [tuple(m) for m in self.weeks[last].get("meals", [])] or chronological_meals(eaten)
+                for distance, meal in enumerate(reversed(meals), start=1):
+                    if meal not in eaten:
+                        continue
+                    for i in group_index.groups(eaten[meal][0]):
+                        distances.setdefault(i, distance)
+        return {"counts": counts, "distances": distances}
+
+    def plan(self, week, food_schedule, preferences, constraints, group_index=None, time_limit=None):
+        """
+        Solve the week's schedule, reusing its earlier plan where possible.
+
+        Returns:
+            dict: {meal: (food, meal_type, salon)} still to reserve, or None if there's no solution
+        """
+        group_index = group_index or ConstraintGroupIndex(constraints)
+        entry = self.weeks.get(week, {})
+        options = {meal_id(meal): fingerprint(opts) for meal, opts in food_schedule.items()}
+        settings = fingerprint([preferences, constraints])
+        previous_plan = {m: o for m, o in self._choices(week, "plan").items() if m in food_schedule}
+        reserved = self.reservations(week)
+        history = self.history(week, constraints, group_index)
+
+        solution = None
+        if previous_plan and entry.get("settings") == settings and entry.get("history") == fingerprint(history):
+            changed = [m for m in food_schedule if entry.get("options", {}).get(meal_id(m)) != options[meal_id(m)]]
+            if not changed and len(previous_plan) == len([m for m, o in food_schedule.items() if o]):
+                print("Nothing changed since the last plan, reusing it")
+                solution = previous_plan
+            elif changed and len(changed) <= len(food_schedule) // 2:
+                window = self.affected_meals(food_schedule, changed, constraints)
+                fixed = {m: o for m, o in previous_plan.items() if m not in window}
+                print(f"Re-planning {len(window)} of {len(food_schedule)} meals")
+                solution = solve_food_schedule(
+                    food_schedule, preferences, constraints, time_limit=time_limit, group_index=group_index,
+                    hints=previous_plan, fixed={**fixed, **reserved}, history=history, cache=self.cache,
+                )
+
+        if solution is None:
+            solution = solve_food_schedule(
+                food_schedule, preferences, constraints, time_limit=time_limit, group_index=group_index,
+                hints=previous_plan, fixed=reserved, history=history, cache=self.cache,
+            )
+        if solution is None:
+            return None
+
+        entry.update(
+            meals=[list(m) for m in chronological_meals(food_schedule)],
+            options=options,
+            settings=settings,
+            history=fingerprint(history),
+            plan={meal_id(m): list(o) for m, o in solution.items()},
+        )
+        self.weeks[week] = entry
+        return {m: o for m, o in solution.items() if m not in reserved}
+
+    @staticmethod
+    def affected_meals(food_schedule, changed, constraints):
+        """
+        Changed meals, plus the meals close enough to them for a gap constraint to tie them together.
+        """
+        reach = max([int(c["gap"]) - 1 for c in constraints if c.get("gap")] + [0])
+        meals = chronological_meals(food_schedule)
+        positions = {meal: p for p, meal in enumerate(meals)}
+        affected = set()
+        for meal in changed:
+            p = positions[meal]
+            affected.update(meals[max(0, p - reach):p + reach + 1])
+        return affected
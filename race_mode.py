@@ -0,0 +1,100 @@
+import datetime
+import time
+from contextlib import contextmanager
+
+from page_interactions import NO_MEAL_PLAN_TEXT, select_salon
+from tracing import span
+
+LATE_START_GRACE = datetime.timedelta(minutes=10)
+
+
+def parse_target_time(text, now=None):
+    """
+    Parse "HH:MM:SS" into the datetime it next comes at: today, or tomorrow if it's already more than
+    LATE_START_GRACE past today (e.g. started at 23:55 for 00:00:05). A run started a little after the
+    target races right away.
+    """
+    now = now or datetime.datetime.now()
+    target_time = datetime.datetime.strptime(text, "%H:%M:%S").time()
+    target = datetime.datetime.combine(now.date(), target_time)
+    if now - target > LATE_START_GRACE:
+        target += datetime.timedelta(days=1)
+        print(f"{text} has passed today, racing at {target:%Y-%m-%d %H:%M:%S}")
+    return target
+
+
+class PhaseTimer:
+    """
+    Measures how long each phase of a run takes and when it ends relative to a reference time.
+    """
+
+    def __init__(self, reference=None):
+        self.reference = reference
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, end - start, datetime.datetime.now()))
+
+    def report(self):
+        print("-" * 40)
+        print("Phase latencies:")
+        for name, duration, ended_at in self.phases:
+            line = f"  {name:<12} {duration * 1000:9.0f} ms"
+            if self.reference is not None:
+                offset = (ended_at - self.reference).total_seconds()
+                line += f"   (ended at T{offset:+.3f} s)"
+            print(line)
+        print(f"  {'total':<12} {sum(d for _, d, _ in self.phases) * 1000:9.0f} ms")
+        print("-" * 40)
+
+
+def wait_until(target, keepalive=None, keepalive_interval=60, spin=0.2):
+    """
+    Sleep until `target`, calling `keepalive()` every `keepalive_interval` seconds meanwhile.
+    The last `spin` seconds are busy-waited, so we wake up on time rather than at the OS's whim.
+    """
+    last_keepalive = time.monotonic()
+    while True:
+        remaining = (target - datetime.datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        if remaining > spin:
+            if keepalive and time.monotonic() - last_keepalive >= keepalive_interval and remaining > keepalive_interval / 2:
+                keepalive()
+                last_keepalive = time.monotonic()
+                continue
+            time.sleep(min(remaining - spin, 1))
+
+
+def keep_page_alive(page):
+    """
+    Reload next week's program, which keeps the session's token in use.
+    """
+    try:
+        page.get_by_text("هفته بعد").click()
+    except Exception as e:
+        print(f"Keep-alive failed: {e}")
+
+
+def wait_for_meal_plan(page, salon, timeout=120, poll_interval=0.5):
+    """
+    Re-open a salon's program until its meal plan is published.
+
+    Returns:
+        bool: True once the plan is shown, False if `timeout` seconds passed first
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        select_salon(page, salon)
+        if page.get_by_text(NO_MEAL_PLAN_TEXT).count() == 0 and page.locator(".program-reserve-item").count() > 0:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
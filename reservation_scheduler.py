@@ -0,0 +1,61 @@
+SWITCH_PENALTY = 0.5
+GAP_WEIGHT = 1.0
+# attempts assumed at the average sell-out rate, so one sell-out of a rarely seen food doesn't outweigh everything
+PRIOR_ATTEMPTS = 3
+
+
+class ReservationScheduler:
+    """
+    Picks which planned reservation to make next: the ones most likely to be lost first, without
+    switching salons more than needed.
+
+    A reservation's risk is the food's sell-out rate, from past sell-out alerts and the ones seen
+    earlier in this run, plus how much preference would be lost if it sold out: the score gap to the
+    meal's next best option that still fits the constraints, relative to the preferences' range.
+    Staying in the open salon is worth `switch_penalty` of risk, so 0 reserves strictly by risk and
+    a large penalty reserves salon by salon, riskiest salon first.
+    """
+
+    def __init__(self, backups, sell_outs=None, switch_penalty=SWITCH_PENALTY, gap_weight=GAP_WEIGHT):
+        """
+        Args:
+            backups: BackupPlans being reserved
+            sell_outs: {food: (times sold out, reserve attempts)} of earlier runs, e.g. FoodCatalog.sell_outs()
+        """
+        self.backups = backups
+        self.sell_outs = sell_outs or {}
+        self.switch_penalty = switch_penalty
+        self.gap_weight = gap_weight
+        scores = list(backups.preferences.values()) or [0]
+        self.score_range = (max(scores) - min(scores)) or 1
+        sold_out, attempts = map(sum, zip((0, 0), *self.sell_outs.values()))
+        self.base_rate = sold_out / attempts if attempts else 0
+
+    def sell_out_rate(self, food):
+        sold_out, attempts = self.sell_outs.get(food, (0, 0))
+        for _, (tried, *_), outcome in self.backups.outcomes:
+            if tried == food:
+                attempts += 1
+                sold_out += outcome == "sold_out"
+        return (sold_out + self.base_rate * PRIOR_ATTEMPTS) / (attempts + PRIOR_ATTEMPTS)
+
+    def preference_gap(self, meal, option):
+        score = self.backups.preferences.get(option[0], 0)
+        alternatives = self.backups.alternatives(meal)
+        if not alternatives:
+            return 1.0
+        return max(0, score - self.backups.preferences.get(alternatives[0][0], 0)) / self.score_range
+
+    def risk(self, meal, option):
+        return self.sell_out_rate(option[0]) + self.gap_weight * self.preference_gap(meal, option)
+
+    def next(self, pending, salon=None):
+        """
+        Args:
+            pending: {meal: (food, meal_type, salon)} not reserved yet
+            salon: The salon that's open
+
+        Returns:
+            tuple: (meal, option) to reserve next
+        """
+        return max(pending.items(), key=lambda item: self.risk(*item) + (self.switch_penalty if item[1][2] == salon else 0))
@@ -0,0 +1,112 @@
+import fnmatch
+import json
+from collections import Counter
+from urllib.parse import urlparse
+
+# Only the program's DOM is needed, none of these
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+FIRST_PARTY_HOSTS = ("samad.app",)
+RESOURCE_SIZES_PATH = "info/resource_sizes.json"
+
+
+def host_matches(host, patterns):
+    """
+    True if `host` is one of `patterns`, a subdomain of one, or matches one as a glob (e.g. "*.cdn.net").
+    """
+    return any(host == p or host.endswith("." + p) or fnmatch.fnmatch(host, p) for p in patterns)
+
+
+class ResourceBlocker:
+    """
+    Aborts requests for images, media, fonts and third-party hosts in a browser context.
+
+    Sizes of the responses that do load are remembered on disk, so the bytes saved by
+    blocking a url can be estimated on later runs.
+
+    Args:
+        allowlist: Hosts (or host globs) that are never blocked
+        block_types: Playwright resource types to block
+        first_party: Hosts that aren't third-party
+        dry_run: Only count what would be blocked and let it load, which also records its size
+    """
+
+    def __init__(self, allowlist=(), block_types=BLOCKED_RESOURCE_TYPES, first_party=FIRST_PARTY_HOSTS,
+                 sizes_path=RESOURCE_SIZES_PATH, dry_run=False):
+        self.dry_run = dry_run
+        self.allowlist = tuple(allowlist)
+        self.block_types = set(block_types)
+        self.first_party = tuple(first_party)
+        self.sizes_path = sizes_path
+        try:
+            with open(sizes_path, "r", encoding="utf-8") as f:
+                self.known_sizes = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.known_sizes = {}
+        self.blocked = Counter()
+        self.blocked_urls = []
+        self.blocked_url_set = set()
+        self.allowed = 0
+        self.loaded_bytes = 0
+
+    def should_block(self, url, resource_type):
+        host = urlparse(url).hostname or ""
+        if not host or host_matches(host, self.allowlist):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return not host_matches(host, self.first_party)
+
+    def handle(self, route, request=None):
+        """
+        Route handler. Returns the abort/continue call so it works with both the sync and the async api.
+        """
+        request = request or route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked[request.resource_type] += 1
+            self.blocked_urls.append(request.url)
+            self.blocked_url_set.add(request.url)
+            return route.continue_() if self.dry_run else route.abort()
+        self.allowed += 1
+        return route.continue_()
+
+    def observe(self, response):
+        size = response.headers.get("content-length")
+        if size and size.isdigit():
+            if not (self.dry_run and response.url in self.blocked_url_set):
+                self.loaded_bytes += int(size)
+            self.known_sizes[response.url] = int(size)
+
+    def attach(self, context):
+        context.route("**/*", self.handle)
+        context.on("response", self.observe)
+
+    async def attach_async(self, context):
+        await context.route("**/*", self.handle)
+        context.on("response", self.observe)
+
+    def saved_bytes(self):
+        """
+        Returns:
+            tuple: (estimated bytes saved, number of blocked urls whose size is known)
+        """
+        known = [self.known_sizes[url] for url in self.blocked_urls if url in self.known_sizes]
+        if not known:
+            return 0, 0
+        # unknown urls are assumed to be as large as the known ones on average
+        return round(sum(known) / len(known) * len(self.blocked_urls)), len(known)
+
+    def save(self):
+        with open(self.sizes_path, "w", encoding="utf-8") as f:
+            json.dump(self.known_sizes, f)
+
+    def report(self):
+        total = sum(self.blocked.values())
+        saved, known = self.saved_bytes()
+        by_type = ", ".join(f"{t}: {n}" for t, n in self.blocked.most_common())
+        verb = "Would block" if self.dry_run else "Blocked"
+        print(f"{verb} {total} of {total + self.allowed} requests ({by_type or 'none'})")
+        if known:
+            print(f"{'Would save' if self.dry_run else 'Saved'} ~{saved / 1024:.0f} KB (sizes of {known}/{total} blocked urls known from earlier runs), "
+                  f"loaded {self.loaded_bytes / 1024:.0f} KB")
+        else:
+            print(f"Loaded {self.loaded_bytes / 1024:.0f} KB, sizes of blocked urls are learned by --block-dry-run runs")
@@ -0,0 +1,134 @@
+import json
+import random
+import time
+from collections import deque
+
+BASE_DELAY = 0.25
+MAX_DELAY = 4.0
+SALON_BUDGET = 60
+BREAKER_ERRORS = 5
+BREAKER_WINDOW = 10.0
+BREAKER_PAUSE = 8.0
+
+# outcomes that say the site is struggling and are worth retrying, as opposed to answers about the food itself
+RETRYABLE_OUTCOMES = ("error", "timeout")
+# outcomes of foods that weren't tried because the salon is out of attempts, or its breaker is open
+SKIP_REASONS = {
+    "budget": "{salon} is out of reserve attempts",
+    "breaker": "{salon} is paused after too many errors",
+}
+SKIPPED_OUTCOMES = tuple(SKIP_REASONS)
+
+
+class RetryPolicy:
+    """
+    When and how often reserve attempts are retried, shared by every reservation of a run.
+
+    - Retries wait an exponential backoff with full jitter: a random time up to base_delay * 2^attempt,
+      capped at max_delay, so clients that failed together don't retry together.
+    - Every salon has a budget of attempts for the whole run.
+    - A circuit breaker per salon opens after `breaker_errors` retryable errors within `breaker_window`
+      seconds: the salon is paused for `breaker_pause` seconds, then a single attempt decides whether it
+      closes again or stays open for another pause. Foods of a paused salon are skipped, not waited for.
+
+    Every attempt is recorded, with its outcome and timing, in `records`.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=BASE_DELAY, max_delay=MAX_DELAY, salon_budget=SALON_BUDGET,
+                 breaker_errors=BREAKER_ERRORS, breaker_window=BREAKER_WINDOW, breaker_pause=BREAKER_PAUSE, seed=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.salon_budget = salon_budget
+        self.breaker_errors = breaker_errors
+        self.breaker_window = breaker_window
+        self.breaker_pause = breaker_pause
+        self.rng = random.Random(seed)
+        self.used = {}
+        self.errors = {}
+        self.open_until = {}
+        self.records = []
+
+    def delay(self, attempt):
+        """
+        Seconds to wait before retrying after `attempt` (0 for the first) failed.
+        """
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def pause(self, salon):
+        """
+        Seconds until the salon's circuit breaker lets an attempt through, 0 if it's closed.
+        """
+        return max(0.0, self.open_until.get(salon, 0) - time.monotonic())
+
+    def blocked(self, salon):
+        """
+        Returns:
+            str: 'budget' if the salon is out of attempts, 'breaker' if its breaker is open, else None
+        """
+        if self.remaining(salon) == 0:
+            return "budget"
+        if self.pause(salon):
+            return "breaker"
+        return None
+
+    def remaining(self, salon):
+        """
+        Attempts left in the salon's budget.
+        """
+        return max(0, self.salon_budget - self.used.get(salon, 0))
+
+    def breaker_left(self, salon):
+        """
+        Errors that would open the salon's breaker now: 1 while it's half-open.
+        """
+        now = time.monotonic()
+        if salon in self.open_until and now >= self.open_until[salon]:
+            return 1
+        recent = sum(now - at <= self.breaker_window for at in self.errors.get(salon, ()))
+        return max(1, self.breaker_errors - recent)
+
+    def record(self, salon, day, meal_type, food, attempt, outcome, elapsed, at=None, **details):
+        """
+        Count an attempt against the salon's budget, feed the breaker and keep its record.
+
+        Args:
+            at: time.monotonic() of the attempt, if it was made earlier (e.g. in the page) and is recorded now
+        """
+        now = time.monotonic() if at is None else at
+        self.used[salon] = self.used.get(salon, 0) + 1
+        errors = self.errors.setdefault(salon, deque())
+        if outcome in RETRYABLE_OUTCOMES:
+            errors.append(now)
+        while errors and now - errors[0] > self.breaker_window:
+            errors.popleft()
+        half_open = salon in self.open_until and now >= self.open_until[salon]
+        if outcome in RETRYABLE_OUTCOMES and (len(errors) >= self.breaker_errors or half_open):
+            self.open_until[salon] = now + self.breaker_pause
+            errors.clear()
+            print(f"Too many errors from {salon}, pausing it for {self.breaker_pause:g} s")
+        elif half_open:
+            del self.open_until[salon]
+        self.records.append({
+            "time": time.time() - (time.monotonic() - now), "salon": salon, "day": day, "meal": meal_type, "food": food,
+            "attempt": attempt + 1, "outcome": outcome, "elapsed": round(elapsed, 4), **details,
+        })
+
+    def summary(self):
+        """
+        Returns:
+            dict: {salon: {outcome: count}}
+        """
+        summary = {}
+        for record in self.records:
+            outcomes = summary.setdefault(record["salon"], {})
+            outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+        return summary
+
+    def save(self, path):
+        """
+        Append the records to a JSON lines file.
+        """
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,254 @@
+"""
+Offline regression checks and benchmarks for the page scripts in page_interactions.
+
+Salon pages recorded with `python main.py --record fixtures/` (or synthetic pages) are loaded into
+a local page with all network access blocked, then get_foods_by_day_and_meal, reserve_food and
+reserve_foods are timed against them. Recorded pages are also checked against the schedule
+extracted when recording.
+
+    python scrape_benchmark.py --fixtures fixtures/ --repeat 20 --json bench.json
+"""
+import argparse
+import html
+import json
+import os
+import re
+import statistics
+import time
+
+from playwright.sync_api import sync_playwright
+
+from page_interactions import SOLD_OUT_TEXT, get_foods_by_day_and_meal, reserve_food, reserve_foods
+
+DAYS = ["شنبه", "یکشنبه", "دوشنبه", "سه‌شنبه", "چهارشنبه", "پنجشنبه", "جمعه"]
+MEALS = ["ناهار", "شام"]
+
+# Mimics the site's reaction to reserve clicks: the count goes up and the button becomes `.reserve-inc`,
+# or a sold-out alert shows up for items marked `data-sold-out`. Also added to recorded pages, whose
+# own scripts are stripped.
+SYNTHETIC_PAGE_SCRIPT = """
+document.addEventListener('click', (event) => {
+    const alert = event.target.closest('[role="alert"]');
+    if (alert) { alert.remove(); return; }
+    const button = event.target.closest('.button-reserve, .reserve-inc');
+    if (!button) return;
+    const item = button.closest('.program-reserve-item');
+    setTimeout(() => {
+        if (item.dataset.soldOut) {
+            const el = document.createElement('div');
+            el.setAttribute('role', 'alert');
+            el.textContent = %s;
+            document.body.appendChild(el);
+            return;
+        }
+        const count = item.querySelector('.reserve-count');
+        if (count) {
+            count.textContent = String(Number(count.textContent) + 1);
+        } else {
+            button.textContent = '+';
+        }
+        if (button.classList.contains('button-reserve')) {
+            button.classList.replace('button-reserve', 'reserve-inc');
+        }
+    }, 20);
+});
+""" % json.dumps(SOLD_OUT_TEXT)
+
+
+def synthetic_salon_html(items_per_meal=3, days=DAYS, meals=MEALS, sold_out_every=0, salon="synthetic"):
+    """
+    Build a salon page with the same structure as the site's weekly program.
+
+    Args:
+        items_per_meal: Number of foods per (day, meal)
+        sold_out_every: Mark every n-th item as sold out (0 for none)
+    """
+    headers = "".join(
+        f'<div class="reserve-program-col"><span class="week-day-name">{html.escape(day)}</span></div>' for day in days
+    )
+    columns = []
+    n = 0
+    for d, day in enumerate(days):
+        items = []
+        for meal in meals:
+            for i in range(items_per_meal):
+                n += 1
+                sold_out = ' data-sold-out="1"' if sold_out_every and n % sold_out_every == 0 else ""
+                items.append(
+                    f'<div class="program-reserve-item"{sold_out}>'
+                    f'<span class="font-bold">{html.escape(meal)}</span>'
+                    f'<span class="item-name">{html.escape(f"{salon} غذای {d}-{meal}-{i}")}</span>'
+                    f'<span class="item-price">{(i + 1) * 10000}</span>'
+                    f'<span class="reserve-count">0</span><button class="button-reserve">رزرو</button>'
+                    f'</div>'
+                )
+        columns.append(f'<div class="reserve-program-col">{"".join(items)}</div>')
+    return (
+        '<html><body>'
+        f'<div class="sticky top-0"><div class="flex">{headers}</div></div>'
+        f'<div class="flex">{"".join(columns)}</div>'
+        f'<div>جزئیات بیشتر</div>'
+        f'<script>{SYNTHETIC_PAGE_SCRIPT}</script>'
+        '</body></html>'
+    )
+
+
+def fixture_name(salon):
+    return re.sub(r"[^\w.-]+", "_", salon)
+
+
+def record_salon(page, salon, salon_schedule, fixtures_dir):
+    """
+    Save the shown salon page and the schedule extracted from it, for later replay.
+    """
+    os.makedirs(fixtures_dir, exist_ok=True)
+    base = os.path.join(fixtures_dir, fixture_name(salon))
+    with open(base + ".html", "w", encoding="utf-8") as f:
+        f.write(page.content())
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"salon": salon, "url": page.url, "recorded_at": time.time(), "schedule": salon_schedule},
+                  f, ensure_ascii=False, indent=2)
+
+
+def load_fixtures(fixtures_dir):
+    """
+    Returns:
+        list: (name, html, expected schedule) of every recorded page
+    """
+    fixtures = []
+    for file in sorted(os.listdir(fixtures_dir)):
+        if not file.endswith(".html"):
+            continue
+        base = os.path.join(fixtures_dir, file[:-len(".html")])
+        with open(base + ".html", "r", encoding="utf-8") as f:
+            content = f.read()
+        try:
+            with open(base + ".json", "r", encoding="utf-8") as f:
+                expected = json.load(f)["schedule"]
+        except FileNotFoundError:
+            expected = None
+        # the recorded app would try to boot and talk to the site, only its DOM is needed
+        content = re.sub(r"<script\b[^>]*>.*?</script>", "", content, flags=re.S | re.I)
+        # without a reaction to clicks, every reservation would wait out RESERVE_RESPONSE_TIMEOUT
+        script = f"<script>{SYNTHETIC_PAGE_SCRIPT}</script>"
+        content = content.replace("</body>", script + "</body>", 1) if "</body>" in content else content + script
+        fixtures.append((file[:-len(".html")], content, expected))
+    return fixtures
+
+
+def timings(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+    }
+
+
+def bench_extraction(page, content, repeat):
+    page.set_content(content)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        schedule = get_foods_by_day_and_meal(page)
+        samples.append(time.perf_counter() - start)
+    return schedule, timings(samples)
+
+
+def bench_reservation(page, content, schedule):
+    """
+    Reserve every food of the page once, timing each reserve_food call.
+    """
+    page.set_content(content)
+    samples = []
+    reserved = 0
+    for day, meals in schedule.items():
+        for meal_type, foods in meals.items():
+            for food in foods:
+                start = time.perf_counter()
+                tried = reserve_food(page, day, meal_type, food["name"], max_retries=1)
+                reserved += tried[-1][1] in ("reserved", "increased")
+                samples.append(time.perf_counter() - start)
+    return {**timings(samples), "reserved": reserved} if samples else {}
+
+
+def bench_reservation_batch(page, content, schedule):
+    """
+    Reserve every food of the page once with a single reserve_foods call.
+    """
+    page.set_content(content)
+    items = [(day, meal_type, food["name"]) for day, meals in schedule.items()
+             for meal_type, foods in meals.items() for food in foods]
+    if not items:
+        return {}
+    start = time.perf_counter()
+    outcomes = reserve_foods(page, items, max_retries=1, pace_ms=0)
+    elapsed = time.perf_counter() - start
+    return {"items": len(items), "total_ms": round(elapsed * 1000, 3), "per_item_ms": round(elapsed * 1000 / len(items), 3),
+            "reserved": sum(outcome == "reserved" for outcome in outcomes)}
+
+
+def run_benchmarks(fixtures_dir=None, repeat=10, reserve=True, many_salons=20, headless=True):
+    cases = []
+    if fixtures_dir:
+        cases += [(f"recorded/{name}", content, expected) for name, content, expected in load_fixtures(fixtures_dir)]
+    cases += [
+        ("synthetic/single-salon", synthetic_salon_html(3, sold_out_every=5), None),
+        ("synthetic/many-items", synthetic_salon_html(30, sold_out_every=7), None),
+    ]
+
+    results = {}
+    failures = []
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=headless)
+        context = browser.new_context()
+        context.route("**/*", lambda route: route.abort())
+        page = context.new_page()
+
+        for name, content, expected in cases:
+            schedule, extraction = bench_extraction(page, content, repeat)
+            result = {"extraction": extraction, "items": sum(len(f) for m in schedule.values() for f in m.values())}
+            if expected is not None:
+                result["matches_recording"] = schedule == expected
+                if not result["matches_recording"]:
+                    failures.append(name)
+            if reserve:
+                result["reservation"] = bench_reservation(page, content, schedule)
+                result["reservation_batch"] = bench_reservation_batch(page, content, schedule)
+            results[name] = result
+            print(f"{name}: {result}")
+
+        # switching between many salon pages, as a full scrape does
+        pages = [synthetic_salon_html(3, salon=f"salon{i}") for i in range(many_salons)]
+        start = time.perf_counter()
+        for content in pages:
+            page.set_content(content)
+            get_foods_by_day_and_meal(page)
+        elapsed = time.perf_counter() - start
+        results["synthetic/many-salons"] = {"salons": many_salons, "total_ms": round(elapsed * 1000, 3),
+                                            "per_salon_ms": round(elapsed * 1000 / many_salons, 3)}
+        print(f"synthetic/many-salons: {results['synthetic/many-salons']}")
+
+        context.close()
+        browser.close()
+
+    for name in failures:
+        print(f"✗ {name}: extracted schedule differs from the recording")
+    return results, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", help="Folder of pages recorded with main.py --record")
+    parser.add_argument("--repeat", type=int, default=10, help="Extraction runs per page")
+    parser.add_argument("--salons", type=int, default=20, help="Number of pages in the many-salons case")
+    parser.add_argument("--no-reserve", action="store_true", help="Only benchmark extraction")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results, failures = run_benchmarks(args.fixtures, args.repeat, not args.no_reserve, args.salons)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import time
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+from async_page_interactions import login as async_login
+from page_interactions import login
+
+SESSIONS_DIR = "info/sessions"
+# Sessions older than this aren't even tried, the site would have expired them anyway
+MAX_SESSION_AGE = 12 * 60 * 60
+
+
+def session_path(user_info, sessions_dir=SESSIONS_DIR):
+    account = f"{user_info['university']}_{user_info['username']}"
+    return os.path.join(sessions_dir, re.sub(r"[^\w.-]+", "_", account) + ".json")
+
+
+def load_session(user_info, sessions_dir=SESSIONS_DIR, max_age=MAX_SESSION_AGE):
+    """
+    Returns:
+        dict: {'storage_state', 'dashboard_url', 'saved_at'} or None if there's no usable saved session
+    """
+    try:
+        with open(session_path(user_info, sessions_dir), "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if time.time() - session.get("saved_at", 0) > max_age:
+        return None
+    return session
+
+
+def save_session(user_info, storage_state, dashboard_url, sessions_dir=SESSIONS_DIR):
+    os.makedirs(sessions_dir, exist_ok=True)
+    path = session_path(user_info, sessions_dir)
+    session = {"storage_state": storage_state, "dashboard_url": dashboard_url, "saved_at": time.time()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(session, f, ensure_ascii=False)
+
+
+def forget_session(user_info, sessions_dir=SESSIONS_DIR):
+    try:
+        os.remove(session_path(user_info, sessions_dir))
+    except FileNotFoundError:
+        pass
+
+
+def is_session_valid(page, dashboard_url, timeout=10000):
+    """
+    Open the dashboard and check that the site didn't send us back to the login page.
+    """
+    try:
+        page.goto(dashboard_url)
+        page.get_by_text("رزرو غذا").first.wait_for(timeout=timeout)
+    except PlaywrightTimeoutError:
+        return False
+    return "/login" not in page.url
+
+
+def start_session(browser, user_info, reuse=True, setup_context=None, **context_options):
+    """
+    Create a logged-in context, reusing the account's saved session when it's still valid
+    and falling back to a full login otherwise. `setup_context(context)` is called on every
+    new context before it loads anything.
+
+    Returns:
+        tuple: (context, page, dashboard_url)
+    """
+    session = load_session(user_info) if reuse else None
+    if session is not None:
+        context = browser.new_context(storage_state=session["storage_state"], **context_options)
+        if setup_context:
+            setup_context(context)
+        page = context.new_page()
+        if is_session_valid(page, session["dashboard_url"]):
+            print("Reusing saved session")
+            return context, page, session["dashboard_url"]
+        print("Saved session expired, logging in again")
+        context.close()
+        forget_session(user_info)
+
+    context = browser.new_context(**context_options)
+    if setup_context:
+        setup_context(context)
+    page = context.new_page()
+    login(page, user_info)
+    dashboard_url = page.url
+    save_session(user_info, context.storage_state(), dashboard_url)
+    return context, page, dashboard_url
+
+
+async def is_session_valid_async(page, dashboard_url, timeout=10000):
+    try:
+        await page.goto(dashboard_url)
+        await page.get_by_text("رزرو غذا").first.wait_for(timeout=timeout)
+    except PlaywrightTimeoutError:
+        return False
+    return "/login" not in page.url
+
+
+async def start_session_async(browser, user_info, reuse=True, **context_options):
+    """
+    Async version of start_session.
+    """
+    session = load_session(user_info) if reuse else None
+    if session is not None:
+        context = await browser.new_context(storage_state=session["storage_state"], **context_options)
+        page = await context.new_page()
+        if await is_session_valid_async(page, session["dashboard_url"]):
+            return context, page, session["dashboard_url"]
+        await context.close()
+        forget_session(user_info)
+
+    context = await browser.new_context(**context_options)
+    page = await context.new_page()
+    await async_login(page, user_info)
+    dashboard_url = page.url
+    save_session(user_info, await context.storage_state(), dashboard_url)
+    return context, page, dashboard_url
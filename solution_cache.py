@@ -0,0 +1,89 @@
+import hashlib
+import json
+
+SOLUTION_CACHE_PATH = "info/solution_cache.json"
+MAX_CACHED_SOLUTIONS = 32
+
+
+def canonical_hash(value):
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def choices(solution):
+    return sorted([list(meal), list(option)] for meal, option in solution.items())
+
+
+class SolutionCache:
+    """
+    Solutions of earlier solves, keyed by a hash of everything the solution depends on.
+
+    The key doesn't depend on the order of meals, options or preferences, and only the scores of
+    foods on the menu count. The least recently used entries are dropped past `max_entries`.
+    Hits only reorder the entries in memory; `flush` writes that order out if nothing was put since.
+    """
+
+    def __init__(self, path=SOLUTION_CACHE_PATH, max_entries=MAX_CACHED_SOLUTIONS):
+        self.path = path
+        self.max_entries = max_entries
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+        self.reordered = False
+
+    @staticmethod
+    def key(food_schedule, preferences, constraints, fixed=None, history=None, exclude=None):
+        """
+        Hash of a solve_food_schedule problem. Hints aren't part of it, they don't change the optimum.
+        """
+        schedule = sorted(
+            [list(meal), sorted(list(option) for option in options)] for meal, options in food_schedule.items()
+        )
+        foods = {food for options in food_schedule.values() for food, *_ in options}
+        scores = {food: preferences.get(food, 0) for food in foods}
+        return canonical_hash([
+            schedule, scores, constraints, choices(fixed or {}), history or {},
+            [choices(solution) for solution in exclude or []],
+        ])
+
+    def get(self, key):
+        """
+        Returns:
+            dict: The cached {meal: (food, meal_type, salon)}, or None
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.entries[key] = entry
+        self.reordered = True
+        return {tuple(meal): tuple(option) for meal, option in entry["solution"]}
+
+    def latest(self, constraints):
+        """
+        The most recent solution under the same constraints, to start a new solve from.
+        """
+        settings = canonical_hash(constraints)
+        for entry in reversed(list(self.entries.values())):
+            if entry.get("settings") == settings:
+                return {tuple(meal): tuple(option) for meal, option in entry["solution"]}
+        return None
+
+    def put(self, key, solution, constraints):
+        self.entries.pop(key, None)
+        self.entries[key] = {
+            "settings": canonical_hash(constraints),
+            "solution": [[list(meal), list(option)] for meal, option in solution.items()],
+        }
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        self.save()
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, ensure_ascii=False)
+        self.reordered = False
+
+    def flush(self):
+        if self.reordered:
+            self.save()
@@ -0,0 +1,210 @@
+"""
+Model-build and solve times of solve_food_schedule on synthetic schedules.
+
+Each dimension (weeks, salons, options per meal, constraint groups, gap size) is swept on its own
+around a base case, or all of them together with --grid. The account config in info/ is always
+run as a baseline. Results can be saved with --json and compared against an earlier run with
+--compare, e.g. one made before a commit:
+
+    python solver_benchmark.py --weeks 1 4 12 --groups 0 3 6 --json after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import random
+import re
+import subprocess
+import time
+
+from CSP_solver import solve_food_schedule
+from mock_server import DAYS, MEALS
+from utils import load_config, preference_scores
+
+BASE_CASE = {"weeks": 1, "salons": 3, "options": 3, "groups": 3, "gap": 3}
+
+
+def load_food_names(path="info/all_foods.txt"):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return sorted({line.strip() for line in f if line.strip()})
+    except FileNotFoundError:
+        return [f"غذای {i}" for i in range(60)]
+
+
+def synthetic_schedule(weeks=1, salons=3, options_per_meal=3, foods=None, seed=0, salon_names=None):
+    """
+    Build a schedule in solve_food_schedule's shape. One week is keyed by (day, meal_type),
+    more weeks by (week, day, meal_type).
+
+    Returns:
+        dict: {meal: [(food, meal_type, salon)]}
+    """
+    foods = foods or load_food_names()
+    salon_names = salon_names or [f"salon{s}" for s in range(salons)]
+    rng = random.Random(seed)
+    schedule = {}
+    for week in range(weeks):
+        for day in DAYS:
+            for meal_type in MEALS:
+                meal = (day, meal_type) if weeks == 1 else (week, day, meal_type)
+                schedule[meal] = [
+                    (food, meal_type, salon)
+                    for salon in salon_names
+                    for food in rng.sample(foods, min(options_per_meal, len(foods)))
+                ]
+    return schedule
+
+
+def synthetic_preferences(schedule, seed=0):
+    rng = random.Random(seed)
+    foods = sorted({food for options in schedule.values() for food, *_ in options})
+    return {food: rng.randrange(0, len(foods)) for food in foods}
+
+
+def synthetic_constraints(schedule, groups=3, gap=0, seed=0):
+    """
+    Split the schedule's foods into disjoint groups of a few foods each. Every group is limited to
+    about a third of the meals it's offered in, and gets the `gap` if it's 2 or more.
+    """
+    rng = random.Random(seed)
+    foods = sorted({food for options in schedule.values() for food, *_ in options})
+    rng.shuffle(foods)
+    size = max(1, len(foods) // max(1, groups * 3))
+    constraints = []
+    for g in range(groups):
+        group_foods = foods[g * size:(g + 1) * size]
+        if not group_foods:
+            break
+        offered = sum(any(food in group_foods for food, *_ in options) for options in schedule.values())
+        constraint = {"foods": [re.escape(food) for food in group_foods], "limit": max(1, offered // 3)}
+        if gap >= 2:
+            constraint["gap"] = gap
+        constraints.append(constraint)
+    return constraints
+
+
+def bench(schedule, preferences, constraints, time_limit=None, solver="auto"):
+    stats = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        solve_food_schedule(schedule, preferences, constraints, time_limit=time_limit, stats=stats, solver=solver)
+    return stats
+
+
+def sweep_cases(dimensions, grid=False):
+    """
+    Args:
+        dimensions: {dimension: [values]}, the ones not given stay as in BASE_CASE
+
+    Returns:
+        list: Case dicts with every dimension of BASE_CASE
+    """
+    if grid:
+        return [{**BASE_CASE, **dict(zip(dimensions, values))} for values in itertools.product(*dimensions.values())]
+    cases = [dict(BASE_CASE)]
+    for name, values in dimensions.items():
+        for value in values:
+            case = {**BASE_CASE, name: value}
+            if case not in cases:
+                cases.append(case)
+    return cases
+
+
+def case_name(case):
+    return " ".join(f"{name}={case[name]}" for name in BASE_CASE)
+
+
+def run_case(case, time_limit=None, solver="auto", seed=0):
+    schedule = synthetic_schedule(case["weeks"], case["salons"], case["options"], seed=seed)
+    preferences = synthetic_preferences(schedule, seed)
+    constraints = synthetic_constraints(schedule, case["groups"], case["gap"], seed)
+    stats = bench(schedule, preferences, constraints, time_limit, solver)
+    return {"name": case_name(case), **case, "meals": len(schedule), **stats}
+
+
+def run_real_config(info_dir="info", time_limit=None, solver="auto", seed=0):
+    """
+    The account's own constraints and preferences, on a synthetic week of its salons.
+    """
+    user_info, constraints, preferences = load_config(info_dir)
+    salons = list(dict.fromkeys(user_info.get("lunch-salons", []) + user_info.get("dinner-salons", [])))
+    schedule = synthetic_schedule(1, options_per_meal=3, foods=load_food_names(f"{info_dir}/all_foods.txt"),
+                                  seed=seed, salon_names=salons or None)
+    week_foods = {food for options in schedule.values() for food, *_ in options}
+    with contextlib.redirect_stdout(io.StringIO()):
+        scores = preference_scores(week_foods, preferences)
+    stats = bench(schedule, scores, constraints, time_limit, solver)
+    return {"name": f"real config ({info_dir})", "weeks": 1, "salons": len(salons), "options": 3,
+            "groups": len(constraints), "gap": max([c.get("gap") or 0 for c in constraints] + [0]),
+            "meals": len(schedule), **stats}
+
+
+def run_suite(cases, info_dir="info", time_limit=None, solver="auto", seed=0):
+    results = []
+    try:
+        results.append(run_real_config(info_dir, time_limit, solver, seed))
+    except FileNotFoundError as e:
+        print(f"Skipping the real config: {e}")
+    for case in cases:
+        results.append(run_case(case, time_limit, solver, seed))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results, previous=None):
+    """
+    Args:
+        previous: Results of an earlier run, to show how the total time of each case changed
+    """
+    before = {r["name"]: r for r in previous or []}
+    print(f"{'case':<42} {'meals':>5} {'vars':>6} {'cons':>6} {'build ms':>9} {'solve ms':>9} "
+          f"{'objective':>9}  {'status':<10} {'solver':<7}{'  vs before' if previous else ''}")
+    for r in results:
+        line = (f"{r['name']:<42} {r['meals']:>5} {r['variables']:>6} {r['constraints']:>6} "
+                f"{r['build_time'] * 1000:>9.1f} {r['solve_time'] * 1000:>9.1f} {r['objective'] or 0:>9.0f}  "
+                f"{r['status']:<10} {r['solver']:<7}")
+        if r["name"] in before:
+            old = before[r["name"]]
+            old_total = old["build_time"] + old["solve_time"]
+            total = r["build_time"] + r["solve_time"]
+            line += f"  {(total / old_total - 1) * 100 if old_total else 0:+.0f}%"
+            if old.get("objective") != r.get("objective"):
+                line += f" (objective was {old.get('objective')})"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weeks", type=int, nargs="+", default=[1, 4, 12])
+    parser.add_argument("--salons", type=int, nargs="+", default=[1, 6])
+    parser.add_argument("--options", type=int, nargs="+", default=[1, 6], help="Foods per meal in every salon")
+    parser.add_argument("--groups", type=int, nargs="+", default=[0, 6], help="Number of constraint groups")
+    parser.add_argument("--gaps", type=int, nargs="+", default=[0, 5], help="Gap of every group, 0 for limits only")
+    parser.add_argument("--grid", action="store_true", help="Run every combination instead of one dimension at a time")
+    parser.add_argument("--solver", choices=["auto", "cp-sat"], default="auto")
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--info", default="info", help="Account folder of the baseline case")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    cases = sweep_cases({"weeks": args.weeks, "salons": args.salons, "options": args.options,
+                         "groups": args.groups, "gap": args.gaps}, grid=args.grid)
+    results = run_suite(cases, args.info, args.time_limit, args.solver, args.seed)
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)["results"]
+    print_results(results, previous)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"commit": git_commit(), "time": time.time(), "solver": args.solver, "seed": args.seed,
+                       "results": results}, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,215 @@
+"""
+Lightweight spans around the phases of a run, every salon and every reservation attempt.
+
+    with span("reserve.attempt", food=food_name, attempt=1) as s:
+        ...
+        s["outcome"] = "reserved"
+
+Spans are only recorded after enable(); until then span() hands out a shared no-op object.
+Parents are tracked with a context variable, so spans nest correctly across threads and asyncio tasks.
+"""
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import threading
+import time
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span(dict):
+    def __init__(self, tracer, name, attributes):
+        super().__init__(attributes)
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self.token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _current.reset(self.token)
+        if exc_type is not None and "outcome" not in self:
+            self["outcome"] = "error"
+            self["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.record(self, end)
+        return False
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, attributes)
+
+    def add(self, name, start, duration, **attributes):
+        """
+        Record a span timed elsewhere (e.g. by a script in the page), starting at time.perf_counter() `start`.
+        """
+        if not self.enabled:
+            return
+        parent = _current.get()
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "start": start - self.origin,
+                "duration": duration,
+                "parent": parent.name if parent is not None else None,
+                "thread": threading.current_thread().name,
+                "attributes": attributes,
+            })
+
+    def record(self, span, end):
+        parent = span.parent.name if span.parent is not None else None
+        with self.lock:
+            self.spans.append({
+                "name": span.name,
+                "start": span.start - self.origin,
+                "duration": end - span.start,
+                "parent": parent,
+                "thread": threading.current_thread().name,
+                "attributes": dict(span),
+            })
+
+    def write_trace(self, path):
+        """
+        Write the spans in Chrome's trace event format, viewable in chrome://tracing or ui.perfetto.dev.
+        """
+        threads = {}
+        events = []
+        for s in self.spans:
+            tid = threads.setdefault(s["thread"], len(threads) + 1)
+            events.append({
+                "name": s["name"], "ph": "X", "pid": 1, "tid": tid,
+                "ts": round(s["start"] * 1e6), "dur": round(s["duration"] * 1e6),
+                "args": {**s["attributes"], "parent": s["parent"]},
+            })
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                   for name, tid in threads.items()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def summary(self):
+        """
+        Returns:
+            dict: {span name: {"count", "seconds", "outcomes": {outcome: count}}}
+        """
+        summary = {}
+        for s in self.spans:
+            entry = summary.setdefault(s["name"], {"count": 0, "seconds": 0.0, "outcomes": {}})
+            entry["count"] += 1
+            entry["seconds"] += s["duration"]
+            outcome = s["attributes"].get("outcome")
+            if outcome is not None:
+                entry["outcomes"][outcome] = entry["outcomes"].get(outcome, 0) + 1
+        return summary
+
+    def write_metrics(self, path, prefix="samad"):
+        """
+        Write the summary as a Prometheus textfile, for node_exporter's textfile collector.
+        """
+        lines = [
+            f"# TYPE {prefix}_span_seconds_total counter",
+            f"# TYPE {prefix}_span_count_total counter",
+            f"# TYPE {prefix}_span_outcomes_total counter",
+        ]
+        for name, entry in sorted(self.summary().items()):
+            lines.append(f'{prefix}_span_seconds_total{{span="{name}"}} {entry["seconds"]:.6f}')
+            lines.append(f'{prefix}_span_count_total{{span="{name}"}} {entry["count"]}')
+            for outcome, count in sorted(entry["outcomes"].items()):
+                lines.append(f'{prefix}_span_outcomes_total{{span="{name}",outcome="{outcome}"}} {count}')
+        lines.append(f"{prefix}_last_run_timestamp_seconds {time.time():.0f}")
+        # written aside and renamed, so the collector never reads half a file
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+    def report(self):
+        print("-" * 40)
+        print("Time per span:")
+        for name, entry in sorted(self.summary().items(), key=lambda item: -item[1]["seconds"]):
+            outcomes = ", ".join(f"{o}: {c}" for o, c in sorted(entry["outcomes"].items()))
+            print(f"  {name:<20} {entry['count']:>4}x {entry['seconds'] * 1000:9.0f} ms  {outcomes}")
+        print("-" * 40)
+
+
+TRACER = Tracer()
+
+
+def enable():
+    TRACER.enabled = True
+
+
+def span(name, **attributes):
+    return TRACER.span(name, **attributes)
+
+
+def add_span(name, start, duration, **attributes):
+    TRACER.add(name, start, duration, **attributes)
+
+
+def traced(name):
+    """
+    Decorator running every call of a function, sync or async, in a span.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with TRACER.span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with TRACER.span(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    """
+    cProfile of the Python side of a run, saved in pstats format.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        print(f"Profile saved to {self.path}, the slowest calls:")
+        pstats.Stats(self.profile).sort_stats("cumulative").print_stats(15)
+        return False
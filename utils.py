@@ -1,4 +1,11 @@
+import datetime
+import json
+import os
 import re
+from collections import defaultdict
+
+from food_catalog import ALL_FOODS_PATH, FoodCatalog
+from food_matcher import FoodNameMatcher
 
 
 def words_presence_regex(words, whole_word=False):
@@ -14,25 +21,22 @@ def words_presence_regex(words, whole_word=False):
     return re.compile(pattern)
 
 
-def match_short_to_full_foodnames(week_food, short_foodnames):
+def match_short_to_full_foodnames(week_food, short_foodnames, matcher=None):
     """
-    Match short food names to full names, selecting the shortest match when multiple exist.
+    Match short food names to full names, selecting the best ranked match (see
+    FoodNameMatcher.candidates) that's not taken by an earlier short name.
+
+    Args:
+        matcher: FoodNameMatcher of known foods; one over week_food is built if it doesn't know them all
     """
+    if matcher is None or not set(week_food) <= matcher.food_set:
+        matcher = FoodNameMatcher(week_food)
     food_names = []
     for food_name_short in short_foodnames:
-        pattern = words_presence_regex(food_name_short)
-        matches = []
-
-        # Find all matching foods
-        for food in week_food:
-            if re.search(pattern, food):  # Use search, not match
-                matches.append(food)
-
-        if matches:
-            # Select the shortest match
-            shortest = min(matches, key=len)
-            food_names.append(shortest)
-            week_food.remove(shortest) # Avoid reusing the same food
+        match = next((food for food in matcher.candidates(food_name_short) if food in week_food), None)
+        if match is not None:
+            food_names.append(match)
+            week_food.remove(match) # Avoid reusing the same food
         else:
             # No match found - you can handle this differently if needed
             print(f"Warning: No match found for '{food_name_short}'")
@@ -40,6 +44,46 @@ def match_short_to_full_foodnames(week_food, short_foodnames):
     return food_names
 
 
+# Persian week days in order, written without spaces or ZWNJ
+DAY_ORDER = ["شنبه", "یکشنبه", "دوشنبه", "سهشنبه", "چهارشنبه", "پنجشنبه", "جمعه"]
+MEAL_ORDER = ["صبحانه", "ناهار", "شام"]
+
+
+def normalize_day_name(day):
+    return re.sub(r"[\s\u200c]", "", str(day)).replace("ي", "ی").replace("ك", "ک")
+
+
+def meal_sort_key(meal):
+    """
+    Chronological sort key of a schedule key: (day, meal_type), or (week, day, meal_type) for
+    multi-week schedules where `week` sorts chronologically (e.g. the week's start date).
+    Unknown days and meal types sort after the known ones.
+    """
+    *week, day, meal_type = meal
+    day = normalize_day_name(day)
+    day_index = DAY_ORDER.index(day) if day in DAY_ORDER else len(DAY_ORDER)
+    meal_index = MEAL_ORDER.index(meal_type) if meal_type in MEAL_ORDER else len(MEAL_ORDER)
+    return (*week, day_index, meal_index)
+
+
+def chronological_meals(meals):
+    """
+    Sort schedule keys chronologically. The sort is stable, so keys of unknown days keep their order.
+    """
+    return sorted(meals, key=meal_sort_key)
+
+
+def preference_scores(week_foods, short_foodnames):
+    """
+    Score this week's foods by their rank in the preferences list, higher is better.
+    """
+    with FoodCatalog() as catalog:
+        matcher = FoodNameMatcher.load(catalog.food_names())
+    preferences = match_short_to_full_foodnames(set(week_foods), short_foodnames, matcher)
+    matcher.save()
+    return {food: len(preferences) - i for i, food in enumerate(preferences)}
+
+
 def transform_food_schedule(raw_schedule, salon_name=None):
     """
     Transform the crawled food schedule from the web scraper format to the format
@@ -85,22 +129,57 @@ def transform_food_schedule(raw_schedule, salon_name=None):
     return transformed
 
 
+def group_reserves_by_salon(reserve_solution):
+    saolon_reserves = defaultdict(list)
+    for (day, meal), (food, meal_type, salon) in reserve_solution.items():
+        saolon_reserves[salon].append((day, meal_type, food))
+    return saolon_reserves
+
+
+def next_week_start(today=None):
+    """
+    Date of the Saturday that starts next week (the week shown by "هفته بعد").
+    """
+    today = today or datetime.date.today()
+    days = (5 - today.weekday()) % 7 or 7
+    return today + datetime.timedelta(days=days)
+
+
+def load_config(info_dir="info"):
+    """
+    Read an account's personal_info.json, constraints.json and preferences.txt.
+
+    Returns:
+        tuple: (user_info, constraints, preferences)
+    """
+    with open(os.path.join(info_dir, "personal_info.json"), "r", encoding="utf-8") as file:
+        user_info = json.load(file)
+
+    with open(os.path.join(info_dir, "constraints.json"), "r", encoding="utf-8") as file:
+        constraints = json.load(file)
+
+    with open(os.path.join(info_dir, "preferences.txt"), "r", encoding="utf-8") as file:
+        preferences = [line.strip() for line in file.readlines() if line.strip()]
+
+    return user_info, constraints, preferences
+
+
 def validate(user_info):
     return True
 
 
-def update_all_foods(this_week_foods):
-    try:
-        with open('info/all_foods.txt', 'r', encoding="utf-8") as f:
-            foods_sofar = {line.strip() for line in f if line.strip()}
-    except FileNotFoundError:
-        foods_sofar = set()
-
-    new_foods = this_week_foods - foods_sofar
+def update_all_foods(this_week_foods, catalog=None):
+    """
+    Add new foods to the catalog, and append them to all_foods.txt to help writing preferences.
+    """
+    if catalog is None:
+        with FoodCatalog() as catalog:
+            return update_all_foods(this_week_foods, catalog)
+    new_foods = catalog.add_foods(sorted(this_week_foods))
 
     # Append just the new ones
     if new_foods:
-        with open('info/all_foods.txt', 'a', encoding="utf-8") as f:
+        with open(ALL_FOODS_PATH, 'a', encoding="utf-8") as f:
             f.write('\n')  # Separate entries
-            for food in sorted(new_foods):
-                f.write(food + '\n')
\ No newline at end of file
+            for food in new_foods:
+                f.write(food + '\n')